@@ -0,0 +1,116 @@
+"""
+scrole_kokaton.pyのゲームを，シードごとにウィンドウなしでまとめて実行するバッチ実行スクリプト
+ProcessPoolExecutorで複数のプロセスに1シードずつ割り振り，結果（スコア，レベル，終了理由，フレーム数）を
+1行1ゲームのJSONとして順に書き出し，最後に集計を出力する
+--set Ghost.interval_range=[100,300]のようにクラス変数を上書きして，バランス調整の比較ができる
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # ウィンドウを出さない
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")  # 集計のJSONだけを標準出力に出す
+import pygame as pg
+
+import scrole_kokaton as sk
+
+
+def parse_override(text: str) -> tuple[str, str, object]:
+    """
+    "クラス名.変数名=値"の形の上書き指定を分解する（値はJSONとして読む）
+    引数 text：上書き指定の文字列
+    戻り値：クラス名，変数名，値のタプル
+    """
+    name, _, value = text.partition("=")
+    cls_name, _, attr = name.partition(".")
+    cls = getattr(sk, cls_name, None)
+    if not isinstance(cls, type) or not hasattr(cls, attr):
+        raise argparse.ArgumentTypeError(f"{name}はscrole_kokatonのクラス変数ではありません")
+    try:
+        return cls_name, attr, json.loads(value)
+    except json.JSONDecodeError:
+        raise argparse.ArgumentTypeError(f"{name}の値{value!r}をJSONとして読めません")
+
+
+def apply_overrides(overrides: list[tuple[str, str, object]]):
+    """
+    クラス変数を上書きする（ワーカープロセスの起動時に1回呼ぶ）
+    引数 overrides：parse_overrideで分解した上書き指定のリスト
+    """
+    for cls_name, attr, value in overrides:
+        setattr(getattr(sk, cls_name), attr, value)
+
+
+def run_one(seed: int, max_frames: int, vector: bool) -> dict:
+    """
+    1シード分のゲームをウィンドウなしで実行する
+    引数1 seed：乱数の種
+    引数2 max_frames：このフレーム数で打ち切る
+    引数3 vector：爆弾とカラスの糞をProjectileArrayで処理するか
+    戻り値：シードとプレイ結果の辞書
+    """
+    result = sk.main(headless=True, seed=seed, max_frames=max_frames, vector=vector, prefetch=0)
+    return {"seed": seed, **asdict(result)}
+
+
+def summarize(results: list[dict]) -> dict:
+    """
+    プレイ結果を集計する
+    引数 results：run_oneの結果のリスト
+    戻り値：ゲーム数，スコアとフレーム数の平均・中央値，レベルと終了理由の内訳の辞書
+    """
+    scores = [r["score"] for r in results]
+    frames = [r["frames"] for r in results]
+    return {
+        "games": len(results),
+        "score": {"mean": statistics.fmean(scores), "median": statistics.median(scores), "max": max(scores)},
+        "frames": {"mean": statistics.fmean(frames), "median": statistics.median(frames)},
+        "level": dict(sorted(Counter(r["level"] for r in results).items())),
+        "cause": dict(Counter(r["cause"] for r in results).most_common()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="シードごとのゲームを複数プロセスでまとめて実行する")
+    parser.add_argument("--games", type=int, default=1000, help="実行するゲームの数")
+    parser.add_argument("--seed", type=int, default=0, help="最初のシード（seed, seed+1, ...を使う）")
+    parser.add_argument("--frames", type=int, default=3000, help="1ゲームをこのフレーム数で打ち切る")
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数（省略時はCPU数）")
+    parser.add_argument("--set", dest="overrides", type=parse_override, action="append", default=[],
+                        metavar="CLASS.ATTR=VALUE", help="クラス変数の上書き（例：Bomb.speed=8，何度でも指定できる）")
+    parser.add_argument("--vector", action="store_true", help="爆弾とカラスの糞をNumPy配列で処理する")
+    parser.add_argument("--out", default="batch.jsonl", help="1行1ゲームの結果を書き出すファイル")
+    args = parser.parse_args()
+
+    workers = args.workers or os.cpu_count() or 1
+    seeds = range(args.seed, args.seed+args.games)
+    chunksize = max(1, args.games//(workers*16))  # プロセス間のやり取りを減らす
+    results = []
+    t0 = time.perf_counter()
+    with open(args.out, "w") as f, ProcessPoolExecutor(workers, initializer=apply_overrides,
+                                                       initargs=(args.overrides,)) as pool:
+        for result in pool.map(run_one, seeds, [args.frames]*args.games, [args.vector]*args.games,
+                               chunksize=chunksize):
+            f.write(json.dumps(result)+"\n")  # 終わった順ではなくシード順に書き出す
+            results.append(result)
+    elapsed = time.perf_counter()-t0
+    summary = {
+        "overrides": {f"{c}.{a}": v for c, a, v in args.overrides},
+        "workers": workers,
+        "seconds": elapsed,
+        "games_per_sec": args.games/elapsed,
+        **summarize(results),
+    }
+    print(json.dumps(summary, indent=2))
+    pg.quit()
+
+
+if __name__ == "__main__":
+    main()
+    sys.exit()
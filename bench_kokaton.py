@@ -0,0 +1,207 @@
+"""
+scrole_kokaton.pyのフレーム処理時間を計測するベンチマーク
+各グループ（ghosts, bombs, funns, beams, coins, fields, Death_Fields）を指定数に保ったまま
+出現処理，衝突判定，update，描画の時間を別々に計り，p50/p95/p99をJSONで出力する
+（--replayを付けると，scrole_kokaton.py --recordで記録したプレイを再生して計測する）
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # ウィンドウを出さない
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")  # 結果のJSONだけを標準出力に出す
+import pygame as pg
+
+import scrole_kokaton as sk
+
+
+BIRD_X = 400  # これより左（こうかとんの周り）にはスプライトを置かない
+GROUPS = ["ghosts", "bombs", "funns", "beams", "coins", "fields", "Death_Fields"]  # 数をそろえるグループ
+
+
+def fill(game: sk.Game, n: int, rng: random.Random):
+    """
+    各グループのスプライト数がnになるまで，画面内のランダムな位置に追加する
+    （こうかとんがやられて衝突判定が途中で終わらないよう，こうかとんの周りには置かない）
+    引数1 game：対象のゲーム
+    引数2 n：グループごとのスプライト数
+    引数3 rng：配置に使う乱数
+    """
+    cam_x = game.camera.x
+    while len(game.ghosts) < n:
+        game.ghosts.add(sk.Ghost(game.tmr, game.rng))
+    shooter = next(iter(game.ghosts))
+    if game.shots is not None:  # ProjectileArrayを使う場合は弾を配列に入れる
+        fill_shots(game, n, rng, shooter)
+    while game.shots is None and len(game.bombs) < n:
+        bomb = game.bomb_pool.acquire(shooter, game.bird, game.camera)
+        bomb.rect.center = cam_x+rng.randint(BIRD_X, sk.WIDTH-50), rng.randint(50, sk.HEIGHT-50)
+        game.bombs.add(bomb)
+    while game.shots is None and len(game.funns) < n:
+        funn = game.funn_pool.acquire(shooter, game.bird, game.camera, game.rng)
+        funn.rect.center = cam_x+rng.randint(BIRD_X, sk.WIDTH-60), rng.randint(60, sk.HEIGHT-60)
+        game.funns.add(funn)
+    while len(game.beams) < n:
+        beam = game.beam_pool.acquire(game.bird)
+        beam.rect.center = rng.randint(BIRD_X, sk.WIDTH-50), rng.randint(50, sk.HEIGHT-50)
+        game.beams.add(beam)
+    while len(game.coins) < n:
+        game.coins.add(sk.Coin(cam_x+rng.randint(BIRD_X, sk.WIDTH), rng.randint(20, sk.HEIGHT-20)))
+    while len(game.fields) < n:
+        game.fields.add(sk.Field(cam_x+rng.randint(BIRD_X, sk.WIDTH), rng.randint(100, sk.HEIGHT), 50, 50))
+    while len(game.Death_Fields) < n:
+        game.Death_Fields.add(sk.Field(cam_x+rng.randint(BIRD_X, sk.WIDTH), rng.randint(100, sk.HEIGHT), 50, 50, (255, 0, 0)))
+
+
+def scatter(game: sk.Game, rng: random.Random):
+    """
+    爆弾とカラスの糞をすべて画面内のランダムな位置に置き直す
+    （前のフレームから飛び続けた弾がこうかとんに当たって衝突判定が途中で終わらないようにする）
+    引数1 game：対象のゲーム
+    引数2 rng：配置に使う乱数
+    """
+    cam_x = game.camera.x
+    if game.shots is not None:
+        shots = game.shots
+        n = shots.n
+        shots.pos[:n, 0] = [cam_x+rng.randint(BIRD_X, sk.WIDTH-60) for _ in range(n)]
+        shots.pos[:n, 1] = [rng.randint(10, sk.HEIGHT-110) for _ in range(n)]
+        return
+    for spr in [*game.bombs, *game.funns]:
+        spr.rect.center = cam_x+rng.randint(BIRD_X, sk.WIDTH-60), rng.randint(60, sk.HEIGHT-60)
+
+
+def fill_shots(game: sk.Game, n: int, rng: random.Random, shooter: sk.Ghost):
+    """
+    ProjectileArrayの爆弾とカラスの糞がそれぞれn個になるまで，画面内のランダムな位置に追加する
+    引数1 game：対象のゲーム（vector=Trueで生成したもの）
+    引数2 n：種類ごとの弾の数
+    引数3 rng：配置に使う乱数
+    引数4 shooter：弾を撃つ敵機（向きの計算に使う）
+    """
+    cam_x = game.camera.x
+    vx, vy = sk.calc_orientation(shooter.rect, game.bird.rect)
+    bomb_img = sk.Assets.get(f"{sk.MAIN_DIR}/fig/fire.png", 0.1)
+    while game.shots.count("bomb") < n:
+        rect = bomb_img.get_rect(center=(cam_x+rng.randint(BIRD_X, sk.WIDTH-50), rng.randint(50, sk.HEIGHT-50)))
+        game.shots.spawn("bomb", bomb_img, rect, int(6*vx), int(6*vy))
+    while game.shots.count("funn") < n:
+        img = sk.Funn.get_img(rng.randint(10, 50), rng.choice(sk.Funn.colors))
+        rect = img.get_rect(center=(cam_x+rng.randint(BIRD_X, sk.WIDTH-60), rng.randint(60, sk.HEIGHT-60)))
+        game.shots.spawn("funn", img, rect, int(6*vx), int(6*vy))
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    """
+    計測値（秒）のp50/p95/p99をミリ秒で返す
+    引数 samples：計測値のリスト
+    戻り値：p50, p95, p99の辞書
+    """
+    q = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50": q[49]*1000, "p95": q[94]*1000, "p99": q[98]*1000}
+
+
+def run_scenario(screen: pg.Surface, n: int, frames: int, seed: int, vector: bool = False) -> dict:
+    """
+    グループごとにn個のスプライトを保ったままframesフレーム分を計測する
+    引数1 screen：描画先の画面Surface
+    引数2 n：グループごとのスプライト数
+    引数3 frames：計測するフレーム数
+    引数4 seed：乱数の種
+    引数5 vector：爆弾とカラスの糞をProjectileArrayで処理するか
+    戻り値：フェーズごとのp50/p95/p99と，衝突判定が途中で終わったフレーム数を含む辞書
+    """
+    rng = random.Random(seed)
+    game = sk.Game(screen, vector=vector, seed=seed)
+    keys = sk.KeyState({pg.K_RIGHT})
+    times = {"spawn": [], "collision": [], "update": [], "draw": [], "total": []}
+    early_exits = 0  # collide()がゲーム終了の理由を返した（すべての判定をしなかった）フレーム数
+    for _ in range(frames):
+        fill(game, n, rng)  # 減った分は計測の外で補充する
+        game.bird.rect.center = 200, sk.HEIGHT//2  # 毎フレーム同じ位置から動かす
+        t0 = time.perf_counter()
+        game.spawn()
+        t1 = time.perf_counter()
+        scatter(game, rng)  # 計測の外で弾をこうかとんから離す（出現処理で撃たれた弾も含む）
+        t2 = time.perf_counter()
+        if game.collide() is not None:
+            early_exits += 1
+        t3 = time.perf_counter()
+        game.move(keys)
+        t4 = time.perf_counter()
+        game.draw()
+        t5 = time.perf_counter()
+        times["spawn"].append(t1-t0)
+        times["collision"].append(t3-t2)
+        times["update"].append(t4-t3)
+        times["draw"].append(t5-t4)
+        times["total"].append(t1-t0+t5-t2)
+    game.close()
+    return {"n": n, "frames": frames, "early_exits": early_exits, **{k: percentiles(v) for k, v in times.items()}}
+
+
+def run_replay(screen: pg.Surface, path: str, vector: bool = False) -> dict:
+    """
+    --recordで記録したプレイを同じ乱数の種と入力で再生し，フレームごとの時間を計測する
+    引数1 screen：描画先の画面Surface
+    引数2 path：記録ファイルのパス
+    引数3 vector：爆弾とカラスの糞をProjectileArrayで処理するか
+    戻り値：フェーズごとのp50/p95/p99と終了理由を含む辞書
+    """
+    inputs = sk.ReplayInput(path)
+    sk.Assets.warm_up(sk.asset_keys())  # 画像の読み込みは計測に含めない
+    game = sk.Game(screen, vector=vector, seed=inputs.seed)
+    times = {"update": [], "draw": [], "total": []}
+    cause = None
+    while cause is None:
+        keys, events = inputs.poll(game.tmr)
+        t0 = time.perf_counter()
+        cause = game.update(keys, events)
+        t1 = time.perf_counter()
+        game.draw()
+        t2 = time.perf_counter()
+        times["update"].append(t1-t0)
+        times["draw"].append(t2-t1)
+        times["total"].append(t2-t0)
+    game.close()
+    return {"replay": path, "frames": game.tmr, "cause": cause, **{k: percentiles(v) for k, v in times.items()}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="フレーム処理時間のベンチマーク")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000],
+                        help="グループごとのスプライト数")
+    parser.add_argument("--frames", type=int, default=100, help="シナリオごとの計測フレーム数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数の種")
+    parser.add_argument("--vector", action="store_true", help="爆弾とカラスの糞をNumPy配列で処理する")
+    parser.add_argument("--replay", default=None, help="シナリオの代わりに，記録したプレイを再生して計測する")
+    parser.add_argument("--out", default=None, help="結果のJSONを書き出すファイル（省略時は標準出力）")
+    args = parser.parse_args()
+
+    pg.init()
+    screen = pg.display.set_mode((sk.WIDTH, sk.HEIGHT))
+    if args.replay is not None:
+        report = {"unit": "ms", "vector": args.vector, **run_replay(screen, args.replay, args.vector)}
+    else:
+        report = {
+            "groups": GROUPS,
+            "unit": "ms",
+            "vector": args.vector,
+            "scenarios": [run_scenario(screen, n, args.frames, args.seed, args.vector) for n in args.sizes],
+        }
+    pg.quit()
+    text = json.dumps(report, indent=2)
+    if args.out is None:
+        print(text)
+    else:
+        with open(args.out, "w") as f:
+            f.write(text+"\n")
+
+
+if __name__ == "__main__":
+    main()
+    sys.exit()
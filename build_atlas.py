@@ -0,0 +1,93 @@
+"""
+scrole_kokaton.pyで使う画像を1枚のアトラス画像にまとめるスクリプト
+こうかとん，敵機，ビーム，爆発などを拡大縮小・回転済みの状態で並べ，
+fig/atlas.pngと切り出し位置の索引fig/atlas.jsonを書き出す
+（ゲームは起動時にこの2つがあれば1回のデコードで全画像を用意する）
+"""
+import argparse
+import json
+import os
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # ウィンドウを出さない
+import pygame as pg
+
+import scrole_kokaton as sk
+
+
+PADDING = 1  # 画像同士の間隔
+
+
+def atlas_keys() -> list[tuple[str, float, float, tuple[bool, bool], bool]]:
+    """
+    アトラスに入れる画像のキャッシュキーを返す（背景など不透明な画像は入れない）
+    戻り値：(パス, 倍率, 角度, 反転, 透過)のリスト
+    """
+    keys = [key for key in sk.asset_keys() if key[4]]
+    no_flip = (False, False)
+    for num in range(10):  # Bird.change_imgで使うこうかとんの全画像
+        path = f"{sk.MAIN_DIR}/fig/{num}.png"
+        if os.path.exists(path):
+            keys.append((path, 2.0, 0, no_flip, True))
+    for num in range(1, 4):  # 敵機の代用画像
+        keys.append((f"{sk.MAIN_DIR}/fig/alien{num}.png", 0.2, 0, no_flip, True))
+    return list(dict.fromkeys(keys))
+
+
+def pack(sizes: list[tuple[int, int]], width: int) -> tuple[list[tuple[int, int]], int]:
+    """
+    高さの大きい順に，左から右へ棚（行）を作って詰める
+    引数1 sizes：画像ごとの(幅, 高さ)のリスト
+    引数2 width：アトラスの幅
+    戻り値：画像ごとの左上座標のリストと，アトラスの高さ
+    """
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    pos = [(0, 0)]*len(sizes)
+    x, y, shelf = 0, 0, 0  # 今の棚の書き込み位置と高さ
+    for i in order:
+        w, h = sizes[i]
+        if w > width:
+            raise ValueError(f"幅{w}の画像がアトラスの幅{width}に入りません")
+        if x+w > width:  # 棚がいっぱいなら次の棚へ
+            x, y, shelf = 0, y+shelf+PADDING, 0
+        pos[i] = x, y
+        x += w+PADDING
+        shelf = max(shelf, h)
+    return pos, y+shelf
+
+
+def main():
+    parser = argparse.ArgumentParser(description="画像をアトラスにまとめる")
+    parser.add_argument("--width", type=int, default=1024, help="アトラスの幅")
+    parser.add_argument("--out", default=f"{sk.MAIN_DIR}/fig/atlas.png", help="アトラス画像のパス（索引は.json）")
+    args = parser.parse_args()
+
+    pg.init()
+    pg.display.set_mode((1, 1))  # convert_alpha用（透過色をアルファ値に変換する）
+    keys = atlas_keys()
+    imgs = [sk.Assets.load(key).convert_alpha() for key in keys]
+    pos, height = pack([img.get_size() for img in imgs], args.width)
+    sheet = pg.Surface((args.width, height), pg.SRCALPHA)
+    entries = []
+    for key, img, (x, y) in zip(keys, imgs, pos):
+        sheet.blit(img, (x, y), special_flags=pg.BLEND_RGBA_MAX)  # 透明な下地に画素をそのまま写す
+        path, scale, angle, flip, _ = key
+        entries.append({
+            "file": os.path.relpath(path, f"{sk.MAIN_DIR}/fig"),
+            "scale": scale,
+            "angle": angle,
+            "flip": list(flip),
+            "rect": [x, y, *img.get_size()],
+            "source": sk.Assets.stamp(path),  # 元画像が変わったら実行時にこの画像を使わない
+        })
+    pg.image.save(sheet, args.out)
+    with open(os.path.splitext(args.out)[0]+".json", "w") as f:
+        json.dump({"size": [args.width, height], "images": entries}, f, indent=1)
+        f.write("\n")
+    pg.quit()
+    print(f"{len(entries)}枚を{args.width}x{height}のアトラスにまとめました：{args.out}")
+
+
+if __name__ == "__main__":
+    main()
+    sys.exit()
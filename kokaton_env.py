@@ -0,0 +1,234 @@
+"""
+scrole_kokaton.pyをGym形式（reset/step）で動かす環境
+モジュールのグローバル変数を使わないので，1つのプロセスで複数のゲームを同時に進められる
+行動は押下キーとスキルキーのビットマスク（InputRecorderの記録と同じ形式）
+観測は数値のリスト，またはobs_sizeを指定すると縮小したグレースケールの画素（NumPy配列のビュー）
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # ウィンドウを出さない
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")  # 計測結果のJSONだけを標準出力に出す
+import pygame as pg
+
+import scrole_kokaton as sk
+
+
+def init_display():
+    """
+    画像の表示形式への変換に必要な画面を用意し，画像を読み込んでおく（すでに画面があれば何もしない）
+    """
+    if pg.display.get_surface() is None:
+        pg.init()
+        pg.display.set_mode((1, 1))
+        sk.Assets.warm_up(sk.asset_keys())
+
+
+class KokatonEnv:
+    """
+    1ゲーム分の環境
+    reset()で新しいゲームを始め，step(action)で1フレーム進める
+    """
+    n_actions = 1 << 7  # 行動の数（押下キー4ビット＋スキルキー3ビット．終了ビットは使わない）
+    obs_names = ("bird_x", "bird_y", "camera_x", "hp", "exp", "level", "score",
+                 "ghosts", "shots", "nearest_dx", "nearest_dy")  # 観測の各要素の名前
+
+    def __init__(self, seed: int | None = None, max_steps: int = 3000, vector: bool = False,
+                 obs_size: tuple[int, int] | None = None):
+        """
+        引数1 seed：ゲームごとの乱数の種を作る乱数の種（Noneなら毎回異なる）
+        引数2 max_steps：このフレーム数で打ち切る
+        引数3 vector：爆弾とカラスの糞をProjectileArrayで処理するか
+        引数4 obs_size：画素を観測にする場合の(幅, 高さ)（Noneなら数値の観測で，stepでは描画しない）
+        """
+        init_display()
+        self.screen = pg.Surface((sk.WIDTH, sk.HEIGHT))  # 画面の代わりの描画先
+        # 画素の観測（obs_sizeがなければrender()で初めて作るので，数値の観測だけならNumPyがなくても動かせる）
+        self.observer = sk.FrameObserver(self.screen, obs_size) if obs_size is not None else None
+        self.obs_size = obs_size
+        self.seeds = random.Random(seed)
+        self.max_steps = max_steps
+        self.vector = vector
+        self.game: sk.Game | None = None
+
+    def reset(self, seed: int | None = None) -> tuple[list[float], dict]:
+        """
+        新しいゲームを始める
+        引数 seed：乱数の種を指定し直す場合に指定する
+        戻り値：最初の観測と情報の辞書
+        """
+        if seed is not None:
+            self.seeds = random.Random(seed)
+        self.close()
+        game_seed = self.seeds.getrandbits(32)
+        self.game = sk.Game(self.screen, vector=self.vector, seed=game_seed, prefetch=0)  # 1エピソードごとにスレッドを作らない
+        return self.observation(), {"seed": game_seed}
+
+    def step(self, action: int) -> tuple[list[float], float, bool, bool, dict]:
+        """
+        行動を1フレーム分入力してゲームを進める
+        引数 action：押下キーとスキルキーのビットマスク（0～n_actions-1）
+        戻り値：観測，報酬（スコアの増分），終了したか，打ち切ったか，情報の辞書
+        """
+        game = self.game
+        keys, events = sk.InputRecorder.decode(action & (__class__.n_actions-1))
+        score = game.score.value
+        cause = game.update(keys, events)
+        reward = float(game.score.value-score)
+        terminated = cause is not None
+        truncated = not terminated and game.tmr >= self.max_steps
+        return self.observation(), reward, terminated, truncated, {"cause": cause, "tmr": game.tmr}
+
+    def threats(self) -> list[tuple[int, int]]:
+        """
+        画面内の爆弾とカラスの糞の中心の画面座標を返す
+        戻り値：(x, y)のリスト
+        """
+        game = self.game
+        if game.shots is not None:
+            shots = game.shots
+            n = shots.n
+            xs = (shots.pos[:n, 0]+shots.size[:n, 0]//2-game.camera.x).tolist()
+            ys = (shots.pos[:n, 1]+shots.size[:n, 1]//2).tolist()
+            return list(zip(xs, ys))
+        return [game.camera.screen_rect(spr).center for group in (game.bombs, game.funns) for spr in group]
+
+    def observation(self) -> "list[float] | sk.np.ndarray":
+        """
+        現在の状態を観測にする
+        obs_sizeを指定した場合は描画して縮小したグレースケールの画素（毎回同じ配列を上書きする）を，
+        そうでなければ数値のリスト（各要素はobs_namesの順）を返す
+        戻り値：観測
+        """
+        game = self.game
+        if self.obs_size is not None:
+            self.draw()
+            return self.observer.gray()
+        bird = game.bird.rect
+        threats = self.threats()
+        dx, dy = sk.WIDTH, sk.HEIGHT  # 弾がなければ画面の大きさ分離れているとみなす
+        if threats:
+            x, y = min(threats, key=lambda c: math.hypot(c[0]-bird.centerx, c[1]-bird.centery))
+            dx, dy = x-bird.centerx, y-bird.centery
+        return [float(v) for v in (bird.centerx, bird.centery, game.camera.x, game.hp_bar.max_hp,
+                                   game.exp_bar.current_exp, game.level_display.level, game.score.value,
+                                   len(game.ghosts), len(threats), dx, dy)]
+
+    def render(self) -> "sk.np.ndarray":
+        """
+        現在の状態を描画し，描画先の画素をコピーせずに返す
+        配列がある間は描画先がロックされるので，次のstepやrenderの前に手放すこと
+        戻り値：(高さ, 幅, 3)のuint8配列（描画先のビュー）
+        """
+        if self.observer is None:  # NumPyがなければFrameObserverがImportErrorを出す
+            self.observer = sk.FrameObserver(self.screen)
+        self.draw()
+        return self.observer.pixels().transpose(1, 0, 2)
+
+    def draw(self):
+        """
+        現在の状態を描画先に描画する（画面の更新はしない）
+        """
+        if self.screen.get_locked():
+            raise RuntimeError("前回のrender()の配列を手放してから進めてください")
+        self.game.draw(present=False)
+
+    def close(self):
+        """
+        ゲームを終了する
+        """
+        if self.game is not None:
+            self.game.close()
+            self.game = None
+
+
+class VectorEnv:
+    """
+    複数のKokatonEnvを1つのプロセスで足並みをそろえて進める環境
+    終わったゲームは自動でreset()し，最後の観測はinfoの"final_observation"に入れる
+    """
+    def __init__(self, n: int, seed: int | None = None, **kwargs):
+        """
+        引数1 n：ゲームの数
+        引数2 seed：乱数の種（ゲームiにはseed+iを使う．Noneなら毎回異なる）
+        引数3 kwargs：KokatonEnvに渡す引数
+        """
+        self.envs = [KokatonEnv(None if seed is None else seed+i, **kwargs) for i in range(n)]
+
+    def __len__(self) -> int:
+        return len(self.envs)
+
+    def reset(self) -> tuple[list[list[float]], list[dict]]:
+        """
+        全ゲームを始める
+        戻り値：ゲームごとの観測と情報のリスト
+        """
+        results = [env.reset() for env in self.envs]
+        return [obs for obs, _ in results], [info for _, info in results]
+
+    def step(self, actions: list[int]) -> tuple[list[list[float]], list[float], list[bool], list[bool], list[dict]]:
+        """
+        全ゲームを1フレームずつ進める
+        obs_sizeを指定した場合の画素の観測はゲームごとに同じ配列を上書きするので，次のstepで書き換わる
+        （final_observationだけはコピーなので残しておける）
+        引数 actions：ゲームごとの行動のリスト
+        戻り値：ゲームごとの観測，報酬，終了したか，打ち切ったか，情報のリスト
+        """
+        obs, rewards, terms, truncs, infos = [], [], [], [], []
+        for env, action in zip(self.envs, actions):
+            o, r, term, trunc, info = env.step(action)
+            if term or trunc:  # 終わったゲームは次のゲームを始める
+                # 画素の観測はresetで上書きされるのでコピーして残す
+                info["final_observation"] = o if isinstance(o, list) else o.copy()
+                o, reset_info = env.reset()
+                info["seed"] = reset_info["seed"]
+            obs.append(o)
+            rewards.append(r)
+            terms.append(term)
+            truncs.append(trunc)
+            infos.append(info)
+        return obs, rewards, terms, truncs, infos
+
+    def close(self):
+        """
+        全ゲームを終了する
+        """
+        for env in self.envs:
+            env.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ランダムな行動で環境を進め，1秒あたりのステップ数を計測する")
+    parser.add_argument("--envs", type=int, default=8, help="同時に進めるゲームの数")
+    parser.add_argument("--steps", type=int, default=1000, help="ゲームごとのステップ数")
+    parser.add_argument("--seed", type=int, default=0, help="乱数の種")
+    parser.add_argument("--vector", action="store_true", help="爆弾とカラスの糞をNumPy配列で処理する")
+    parser.add_argument("--obs-size", type=int, nargs=2, default=None, metavar=("W", "H"),
+                        help="縮小したグレースケールの画素を観測にする（例：--obs-size 160 100）")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    obs_size = None if args.obs_size is None else tuple(args.obs_size)
+    env = VectorEnv(args.envs, args.seed, vector=args.vector, obs_size=obs_size)
+    env.reset()
+    episodes = 0
+    t0 = time.perf_counter()
+    for _ in range(args.steps):
+        actions = [rng.randrange(KokatonEnv.n_actions) for _ in range(len(env))]
+        _, _, terms, truncs, _ = env.step(actions)
+        episodes += sum(term or trunc for term, trunc in zip(terms, truncs))
+    elapsed = time.perf_counter()-t0
+    env.close()
+    pg.quit()
+    print(json.dumps({"envs": args.envs, "obs_size": obs_size, "steps": args.steps*args.envs, "episodes": episodes,
+                      "seconds": elapsed, "steps_per_sec": args.steps*args.envs/elapsed}))
+
+
+if __name__ == "__main__":
+    main()
+    sys.exit()
@@ -1,23 +1,38 @@
+import argparse
+import bisect
+import csv
+import json
 import math
 import os
+import queue
 import random
+import struct
 import sys
+import threading
 import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
 from typing import Any
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")  # --headlessの結果のJSONだけを標準出力に出す
 import pygame as pg
 from pygame.sprite import AbstractGroup
+try:
+    import numpy as np
+except ImportError:  # NumPyがなければ弾の配列化（--vector）と画素の観測（FrameObserver）だけが使えない
+    np = None
 
 
 WIDTH = 1200  # ゲームウィンドウの幅
 HEIGHT = 750  # ゲームウィンドウの高さ
 #screen = pg.display.set_mode((WIDTH, HEIGHT))
 GOAL = 4800
+TICK_RATE = 50  # 1秒あたりのゲームロジックの更新回数（描画の速さとは独立）
+MAX_TICKS = 5  # 1回の描画の間に進める更新回数の上限（これを超える遅れは切り捨てる）
 # WIDTH = 700
 # HEIGHT = 500
 MAIN_DIR = os.path.split(os.path.abspath(__file__))[0]
-MV_FIELD = False# スクロールの許可
-MV_MOVE = False # 移動の許可
-FLY_COUNT = 0 # 飛翔時間のカウント
 
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
@@ -27,6 +42,19 @@ RED = (255, 0, 0)
 YELLOW = (255, 255, 0)
 
 
+def fig_path(*names: str) -> str:
+    """
+    fig内の画像ファイルのパスを返す
+    引数 names：ファイル名の候補（先頭から順に，存在する最初のものを使う）
+    戻り値：画像ファイルのパス
+    """
+    for name in names:
+        path = f"{MAIN_DIR}/fig/{name}"
+        if os.path.exists(path):
+            return path
+    return f"{MAIN_DIR}/fig/{names[0]}"
+
+
 def check_bound(obj: pg.Rect) -> tuple[bool, bool]:
     """
     オブジェクトが画面内か画面外かを判定し，真理値タプルを返す
@@ -53,6 +81,801 @@ def calc_orientation(org: pg.Rect, dst: pg.Rect) -> tuple[float, float]:
     return x_diff/norm, y_diff/norm
 
 
+def _unit(dire: tuple[int, int]) -> tuple[float, float, float]:
+    """
+    8方向の向きから，角度と単位ベクトルを計算する
+    引数 dire：(-1～+1, -1～+1)の向きのタプル
+    戻り値：角度（度，反時計回り），単位ベクトルのx成分，y成分
+    """
+    angle = math.degrees(math.atan2(-dire[1], dire[0]))
+    return angle, math.cos(math.radians(angle)), -math.sin(math.radians(angle))
+
+
+# こうかとんとビームが取りうる8方向と，その(角度, 単位ベクトルx, y)（起動時に一度だけ計算する）
+DIRECTIONS = {dire: _unit(dire) for dire in [(+1, 0), (+1, -1), (0, -1), (-1, -1), (-1, 0), (-1, +1), (0, +1), (+1, +1)]}
+
+
+class Assets:
+    """
+    画像を一度だけ読み込み，拡大縮小・反転・回転を済ませたSurfaceを共有するクラス
+    キーは(パス, 倍率, 角度, 反転, 透過)で，フレームループ中のファイル読み込みとデコードをなくす
+    画面生成後は画面のピクセル形式に変換して持ち，blitのたびの形式変換をなくす
+    """
+    cache: dict[tuple[str, float, float, tuple[bool, bool], bool], pg.Surface] = {}
+    hits = 0  # キャッシュにあった回数
+    misses = 0  # 読み込みが発生した回数
+
+    @classmethod
+    def get(cls, path: str, scale: float = 1.0, angle: float = 0,
+            flip: tuple[bool, bool] = (False, False), alpha: bool = True) -> pg.Surface:
+        """
+        加工済みの画像Surfaceを返す（初回のみ読み込みと加工を行う）
+        引数1 path：画像ファイルのパス
+        引数2 scale：拡大率
+        引数3 angle：回転角度（反転後に回転する）
+        引数4 flip：横方向，縦方向の反転の有無
+        引数5 alpha：透過を使うか（背景など不透明な画像はFalseにしてconvert()する）
+        戻り値：加工済みの画像Surface
+        """
+        key = (path, scale, angle, flip, alpha)
+        img = cls.cache.get(key)
+        if img is not None:
+            cls.hits += 1
+            return img
+        cls.misses += 1
+        return cls.store(key, cls.load(key))
+
+    @staticmethod
+    def load(key: tuple[str, float, float, tuple[bool, bool], bool]) -> pg.Surface:
+        """
+        画像を読み込んで拡大縮小・反転・回転する（画面を使わないのでワーカースレッドから呼べる）
+        引数 key：(パス, 倍率, 角度, 反転, 透過)のタプル
+        戻り値：加工済みの画像Surface（表示形式への変換前）
+        """
+        path, scale, angle, flip, alpha = key
+        img = pg.image.load(path)
+        if flip == (False, False):  # 反転しなければ拡大縮小と回転を1回のrotozoomで行う
+            if scale != 1.0 or angle != 0:
+                img = pg.transform.rotozoom(img, angle, scale)
+            return img
+        if scale != 1.0:
+            img = pg.transform.rotozoom(img, 0, scale)
+        img = pg.transform.flip(img, *flip)
+        if angle != 0:
+            img = pg.transform.rotozoom(img, angle, 1.0)
+        return img
+
+    @classmethod
+    def store(cls, key: tuple[str, float, float, tuple[bool, bool], bool], img: pg.Surface) -> pg.Surface:
+        """
+        読み込んだ画像を表示形式に変換してキャッシュに入れる（メインスレッドから呼ぶ）
+        引数1 key：(パス, 倍率, 角度, 反転, 透過)のタプル
+        引数2 img：loadで読み込んだ画像Surface
+        戻り値：キャッシュに入れた画像Surface
+        """
+        if pg.display.get_surface() is not None:  # 画面生成後なら表示形式に変換する
+            img = img.convert_alpha() if key[4] else img.convert()
+        cls.cache[key] = img
+        return img
+
+    @classmethod
+    def load_atlas(cls, path: str | None = None) -> int:
+        """
+        build_atlas.pyで作った画像1枚にまとめたアトラスを読み込み，各画像を切り出してキャッシュに入れる
+        （アトラスがない場合や，アトラスにない画像，アトラスの作成後に元画像が変わった画像は従来通り個別のファイルから読み込む）
+        引数 path：アトラス画像のパス（Noneならfig/atlas.png．索引は拡張子を.jsonにしたファイル）
+        戻り値：キャッシュに入れた画像の数
+        """
+        if path is None:
+            path = f"{MAIN_DIR}/fig/atlas.png"
+        index = os.path.splitext(path)[0]+".json"
+        if not (os.path.exists(path) and os.path.exists(index)):
+            return 0
+        with open(index) as f:
+            entries = json.load(f)["images"]
+        todo = [((f"{MAIN_DIR}/fig/{entry['file']}", entry["scale"], entry["angle"], tuple(entry["flip"]), True),
+                 entry["rect"], entry.get("source")) for entry in entries]
+        # 作成後に元画像が変わった画像（更新日時か大きさが違うもの）は使わず，個別のファイルから読み込ませる
+        todo = [(key, rect) for key, rect, source in todo
+                if key not in cls.cache and source is not None and source == cls.stamp(key[0])]
+        if not todo:  # すべてキャッシュにあればアトラスをデコードしない（main()を繰り返し呼ぶ場合）
+            return 0
+        sheet = pg.image.load(path)
+        if pg.display.get_surface() is not None:  # 画面生成後なら表示形式に変換する
+            sheet = sheet.convert_alpha()
+        for key, rect in todo:
+            cls.cache[key] = sheet.subsurface(rect)  # 1枚の画像の一部を共有する
+        return len(todo)
+
+    @staticmethod
+    def stamp(path: str) -> list[int] | None:
+        """
+        アトラスの索引に記録する，元画像ファイルの更新日時と大きさを返す
+        引数 path：画像ファイルのパス
+        戻り値：[更新日時（ナノ秒）, バイト数]（ファイルがなければNone）
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return [st.st_mtime_ns, st.st_size]
+
+    @classmethod
+    def warm_up(cls, keys: list[tuple[str, float, float, tuple[bool, bool], bool]], workers: int | None = None,
+                progress=None) -> int:
+        """
+        キャッシュにない画像をスレッドプールで並列に読み込んでおく
+        （デコードと加工はワーカースレッド，表示形式への変換はメインスレッドで行う）
+        引数1 keys：読み込む画像の(パス, 倍率, 角度, 反転, 透過)のリスト
+        引数2 workers：ワーカースレッドの数（NoneならCPU数）
+        引数3 progress：1枚読み込むごとに(読み込んだ数, 全体の数)で呼ぶ関数（Noneなら呼ばない）
+        戻り値：読み込んだ画像の数
+        """
+        todo = [key for key in dict.fromkeys(keys) if key not in cls.cache]
+        if progress is not None:
+            progress(0, len(todo))
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+            futures = {pool.submit(cls.load, key): key for key in todo}
+            for done, future in enumerate(as_completed(futures), 1):
+                cls.store(futures[future], future.result())
+                cls.misses += 1
+                if progress is not None:
+                    progress(done, len(todo))
+        return len(todo)
+
+    @classmethod
+    def convert_all(cls) -> int:
+        """
+        画面生成前に読み込まれてキャッシュにある画像を，画面のピクセル形式に変換し直す
+        戻り値：変換した画像の数
+        """
+        count = 0
+        for key, img in cls.cache.items():
+            if not cls.converted(img):
+                cls.cache[key] = img.convert_alpha() if key[4] else img.convert()
+                count += 1
+        return count
+
+    @staticmethod
+    def converted(img: pg.Surface) -> bool:
+        """
+        Surfaceが画面のピクセル形式（blit時に変換がいらない形式）かを判定する
+        引数 img：判定するSurface
+        戻り値：画面と同じ形式ならTrue（画面がなければFalse）
+        """
+        screen = pg.display.get_surface()
+        if screen is None or img.get_bitsize() != screen.get_bitsize():
+            return False
+        return img.get_masks()[:3] == screen.get_masks()[:3]
+
+    @classmethod
+    def check(cls, surfaces: dict[str, pg.Surface]):
+        """
+        描画に使うSurfaceがすべて画面のピクセル形式になっているかを起動時に確かめる
+        引数 surfaces：名前とSurfaceの辞書（キャッシュ内の画像は自動で含める）
+        """
+        named = {f"{os.path.basename(key[0])}{key[1:]}": img for key, img in cls.cache.items()}
+        named.update(surfaces)
+        bad = [name for name, img in named.items() if not cls.converted(img)]
+        if bad:
+            raise RuntimeError(f"画面の形式に変換されていない画像があります：{', '.join(bad)}")
+
+    @classmethod
+    def stats(cls) -> dict[str, int]:
+        """
+        キャッシュの状態を返す
+        戻り値：キャッシュ数，ヒット数，ミス数の辞書
+        """
+        return {"size": len(cls.cache), "hits": cls.hits, "misses": cls.misses}
+
+
+def asset_keys() -> list[tuple[str, float, float, tuple[bool, bool], bool]]:
+    """
+    ゲーム中にAssets.getで使う画像のキャッシュキーを返す（起動時のwarm_up用）
+    戻り値：(パス, 倍率, 角度, 反転, 透過)のリスト
+    """
+    no_flip, flip_x = (False, False), (True, False)
+    bird = f"{MAIN_DIR}/fig/3.png"
+    explosion = f"{MAIN_DIR}/fig/explosion.gif"
+    keys = [
+        (f"{MAIN_DIR}/fig/pg_bg.jpg", 1.0, 0, no_flip, False),
+        (bird, 2.0, 0, no_flip, True),  # こうかとん（斜めと下向きはBird.get_tableでこれを回転する）
+        (bird, 2.0, 0, flip_x, True),
+        (f"{MAIN_DIR}/fig/6.png", 2.0, 0, no_flip, True),  # 喜び（Bird.change_img）
+        (f"{MAIN_DIR}/fig/8.png", 2.0, 0, no_flip, True),  # 悲しみ
+        (f"{MAIN_DIR}/fig/fire.png", 0.1, 0, no_flip, True),
+        (f"{MAIN_DIR}/fig/ghost.png", 0.3, 0, no_flip, True),
+        (fig_path("crow_1.png", "alien1.png"), 0.2, 0, no_flip, True),
+        (fig_path("crow_2.png", "alien2.png"), 0.2, 0, no_flip, True),
+        (explosion, 1.0, 0, no_flip, True),
+        (explosion, 1.0, 0, (True, True), True),
+        (fig_path("a.jpg", "alien3.png"), 1.0, 0, no_flip, True),
+    ]
+    for angle, _, _ in DIRECTIONS.values():  # ビームの8方向（Beam.get_tableと同じ）
+        keys.append((f"{MAIN_DIR}/fig/beam.png", 2.0, angle, no_flip, True))
+    return keys
+
+
+class LoadingScreen:
+    """
+    画像の読み込み状況をプログレスバーで表示するクラス（Assets.warm_upのprogressにdrawを渡す）
+    """
+    def __init__(self, screen: pg.Surface):
+        """
+        引数 screen：画面Surface
+        """
+        self.screen = screen
+        self.font = pg.font.Font(None, 50)
+        self.bar = pg.Rect(0, 0, 600, 30)
+        self.bar.center = WIDTH//2, HEIGHT//2+20
+
+    def draw(self, done: int, total: int):
+        """
+        読み込み状況を描画して画面を更新する
+        引数1 done：読み込んだ画像の数
+        引数2 total：読み込む画像の数
+        """
+        pg.event.pump()  # 読み込み中もウィンドウが固まらないようにする
+        bar = self.bar
+        self.screen.fill(BLACK)
+        text = self.font.render(f"Loading... {done}/{total}", True, WHITE)
+        self.screen.blit(text, text.get_rect(center=(WIDTH//2, HEIGHT//2-40)))
+        pg.draw.rect(self.screen, WHITE, bar, 2)
+        if total > 0:
+            pg.draw.rect(self.screen, GREEN, (bar.left+4, bar.top+4, (bar.width-8)*done//total, bar.height-8))
+        pg.display.update()
+
+
+class Camera:
+    """
+    スクロール量を管理し，ワールド座標を画面座標に変換するクラス
+    スクロールしてもワールド座標の物体は動かさず，描画時にだけずらす
+    """
+    def __init__(self, speed: int = 5):
+        """
+        引数 speed：1フレームあたりのスクロール量
+        """
+        self.x = 0  # 画面左端のワールドx座標
+        self.speed = speed
+        self.prev_x = 0  # 1つ前の更新でのx
+        self.view_x = 0  # 描画に使う画面左端のワールドx座標（補間するとxとずれる）
+
+    def update(self, scroll: bool):
+        """
+        スクロールが許可されていればカメラを進める
+        引数 scroll：スクロールの許可（こうかとんのmv_field）
+        """
+        self.prev_x = self.x
+        if scroll:
+            self.x += self.speed
+        self.view_x = self.x
+
+    def interpolate(self, alpha: float):
+        """
+        描画に使う位置を，1つ前の更新と最新の更新の間で補間する
+        引数 alpha：補間の割合（0なら1つ前の更新，1なら最新の更新の位置）
+        """
+        self.view_x = round(self.prev_x+(self.x-self.prev_x)*alpha)
+
+    def apply(self, rect: pg.Rect) -> pg.Rect:
+        """
+        ワールド座標のRectを画面座標のRectに変換する
+        引数 rect：ワールド座標のRect
+        戻り値：画面座標のRect
+        """
+        return rect.move(-self.x, 0)
+
+    def screen_rect(self, sprite: pg.sprite.Sprite) -> pg.Rect:
+        """
+        スプライトの画面座標のRectを返す（worldがTrueのスプライトのみ変換する）
+        引数 sprite：対象のスプライト
+        戻り値：画面座標のRect
+        """
+        if getattr(sprite, "world", False):
+            return sprite.rect.move(-self.x, 0)
+        return sprite.rect
+
+    def view_rect(self, sprite: pg.sprite.Sprite) -> pg.Rect:
+        """
+        スプライトを描画する画面座標のRectを返す（補間した位置view_xでずらす）
+        引数 sprite：対象のスプライト
+        戻り値：画面座標のRect
+        """
+        if getattr(sprite, "world", False):
+            return sprite.rect.move(-self.view_x, 0)
+        return sprite.rect
+
+
+class SpatialHash:
+    """
+    一様グリッドによる衝突判定の広域フェーズ
+    グループごとに画面座標でセルへ登録し，近いセルのスプライトだけを精密判定する
+    判定の組み合わせとkillの方向はpg.sprite.spritecollide/groupcollideと同じ
+    """
+    def __init__(self, camera: Camera, cell: int = 128):
+        """
+        引数1 camera：スクロールを管理するカメラ
+        引数2 cell：セルの一辺の長さ
+        """
+        self.camera = camera
+        self.cell = cell
+        self.grids: dict[int, dict[tuple[int, int], tuple[list[pg.Rect], list[tuple[int, pg.sprite.Sprite]]]]] = {}
+
+    def clear(self):
+        """
+        登録をすべて破棄する（毎フレーム衝突判定の前に呼ぶ）
+        破棄後に最初に問い合わせたときにグループを登録し直す
+        """
+        self.grids.clear()
+
+    def _cells(self, rect: pg.Rect):
+        """
+        Rectが重なるセルの座標を列挙する
+        引数 rect：画面座標のRect
+        """
+        c = self.cell
+        for cx in range(rect.left//c, (rect.right-1)//c+1):
+            for cy in range(rect.top//c, (rect.bottom-1)//c+1):
+                yield cx, cy
+
+    def _grid(self, group: pg.sprite.AbstractGroup) -> dict[tuple[int, int], tuple[list[pg.Rect], list[tuple[int, pg.sprite.Sprite]]]]:
+        """
+        グループのグリッドを返す（未登録なら登録する）
+        引数 group：対象のグループ
+        戻り値：セル座標から(画面座標のRectのリスト, (登録順, スプライト)のリスト)への辞書
+        """
+        grid = self.grids.get(id(group))
+        if grid is None:
+            grid = {}
+            screen_rect = self.camera.screen_rect
+            for i, spr in enumerate(group.sprites()):
+                rect = screen_rect(spr)
+                for cell in self._cells(rect):
+                    rects, entries = grid.setdefault(cell, ([], []))
+                    rects.append(rect)
+                    entries.append((i, spr))
+            self.grids[id(group)] = grid
+        return grid
+
+    def _hits(self, sprite: pg.sprite.Sprite, group: pg.sprite.AbstractGroup) -> list[pg.sprite.Sprite]:
+        """
+        spriteと衝突しているgroupのスプライトを登録順で返す
+        引数1 sprite：判定するスプライト
+        引数2 group：相手のグループ
+        戻り値：衝突しているスプライトのリスト
+        """
+        grid = self._grid(group)
+        rect = self.camera.screen_rect(sprite)
+        members = group.spritedict  # group.has()より速いメンバー判定
+        found = {}
+        for cell in self._cells(rect):
+            if cell not in grid:
+                continue
+            rects, entries = grid[cell]
+            for j in rect.collidelistall(rects):  # セル内の精密判定はまとめて行う
+                i, spr = entries[j]
+                if spr in members:  # 既にkillされたものは除く
+                    found[i] = spr
+        if len(found) > 1:
+            return [found[i] for i in sorted(found)]
+        return list(found.values())
+
+    def spritecollide(self, sprite: pg.sprite.Sprite, group: pg.sprite.AbstractGroup,
+                      dokill: bool) -> list[pg.sprite.Sprite]:
+        """
+        pg.sprite.spritecollideと同じ
+        引数1 sprite：判定するスプライト
+        引数2 group：相手のグループ
+        引数3 dokill：衝突した相手をkillするか
+        戻り値：衝突したスプライトのリスト
+        """
+        hits = self._hits(sprite, group)
+        if dokill:
+            for spr in hits:
+                spr.kill()
+        return hits
+
+    def spritecollideany(self, sprite: pg.sprite.Sprite,
+                         group: pg.sprite.AbstractGroup) -> pg.sprite.Sprite | None:
+        """
+        pg.sprite.spritecollideanyと同じ
+        引数1 sprite：判定するスプライト
+        引数2 group：相手のグループ
+        戻り値：最初に衝突したスプライト（なければNone）
+        """
+        hits = self._hits(sprite, group)
+        return hits[0] if hits else None
+
+    def groupcollide(self, group1: pg.sprite.AbstractGroup, group2: pg.sprite.AbstractGroup,
+                     dokill1: bool, dokill2: bool) -> dict[pg.sprite.Sprite, list[pg.sprite.Sprite]]:
+        """
+        pg.sprite.groupcollideと同じ（group2をグリッドに登録し，group1の各スプライトで問い合わせる）
+        引数1 group1：グループ1
+        引数2 group2：グループ2
+        引数3 dokill1：衝突したgroup1のスプライトをkillするか
+        引数4 dokill2：衝突したgroup2のスプライトをkillするか
+        戻り値：group1のスプライトから衝突したgroup2のスプライトのリストへの辞書
+        """
+        crashed = {}
+        for spr in group1.sprites():
+            hits = self.spritecollide(spr, group2, dokill2)
+            if hits:
+                crashed[spr] = hits
+                if dokill1:
+                    spr.kill()
+        return crashed
+
+
+class Renderer:
+    """
+    画面への描画と画面更新をまとめるクラス
+    描画はレイヤーごとのキューに(Surface, 位置)を集め，flushでレイヤーごとに1回のblitsで描く
+    dirtyモードでは，前フレームと今フレームで描いた領域だけを背景で消して
+    display.updateに渡す（スクロールしたフレームは全画面を更新する）
+    """
+    layers = ("world", "actors", "effects", "hud")  # 奥から順の描画レイヤー
+
+    def __init__(self, screen: pg.Surface, bg_img: pg.Surface, camera: Camera, dirty: bool = False):
+        """
+        引数1 screen：画面Surface
+        引数2 bg_img：背景画像Surface
+        引数3 camera：スクロールを管理するカメラ
+        引数4 dirty：変化した領域だけを更新するか
+        """
+        self.screen = screen
+        self.bg_img = bg_img
+        self.camera = camera
+        self.dirty = dirty
+        self.view = screen.get_rect()  # 画面の範囲（これと重ならないスプライトは描かない）
+        self.queue: dict[str, list] = {layer: [] for layer in __class__.layers}  # レイヤーごとの(Surface, 位置)
+        self.rects: list[pg.Rect] = []  # 今フレームに描いた領域
+        self.prev: list[pg.Rect] = []  # 前フレームに描いた領域
+        self.full = True  # 次のpresentで全画面を更新するか
+        self.shown_x: int | None = None  # 前回画面を更新したときのカメラの描画位置
+
+    def begin(self):
+        """
+        フレームの描画を始める（前フレームに描いた領域を背景で消す）
+        """
+        if self.dirty and not self.full:
+            for rect in self.prev:
+                self.screen.blit(self.bg_img, rect, rect)
+        else:
+            self.screen.blit(self.bg_img, [0, 0])
+
+    def draw(self, group: pg.sprite.AbstractGroup, layer: str):
+        """
+        グループのスプライトをレイヤーのキューに積む（ワールド座標のスプライトはカメラでずらし，
+        画面外のスプライトは積まない）
+        引数1 group：描画するグループ
+        引数2 layer：積むレイヤー
+        """
+        view_rect, view = self.camera.view_rect, self.view
+        pairs = self.queue[layer]
+        for spr in group:
+            rect = view_rect(spr)
+            if view.colliderect(rect):
+                pairs.append((spr.image, rect))
+
+    def blit(self, image: pg.Surface, dest, layer: str):
+        """
+        1枚のSurfaceをレイヤーのキューに積む
+        引数1 image：描画するSurface
+        引数2 dest：描画する画面座標（Rectまたは左上の座標）
+        引数3 layer：積むレイヤー
+        """
+        self.queue[layer].append((image, dest))
+
+    def extend(self, pairs: list, layer: str):
+        """
+        (Surface, 画面座標)の組をまとめてレイヤーのキューに積む
+        引数1 pairs：(Surface, 画面座標)のリスト
+        引数2 layer：積むレイヤー
+        """
+        self.queue[layer].extend(pairs)
+
+    def flush(self, layer: str):
+        """
+        レイヤーのキューを1回のblitsで描画し，描いた領域を記録する
+        引数 layer：描画するレイヤー
+        """
+        pairs = self.queue[layer]
+        if pairs:
+            self.rects.extend(self.screen.blits(pairs))
+            pairs.clear()
+
+    def present(self):
+        """
+        画面を更新する（dirtyモードでは消した領域と描いた領域だけ）
+        """
+        if self.dirty and not self.full and self.camera.view_x == self.shown_x:
+            pg.display.update(self.prev+self.rects)
+        else:  # スクロールしたら全画面を更新する
+            pg.display.update()
+        self.prev, self.rects = self.rects, []
+        self.full = False
+        self.shown_x = self.camera.view_x
+
+
+class FrameObserver:
+    """
+    描画先のSurfaceを，コピーせずにNumPy配列のビューとして見せるクラス（ボットの観測や録画に使う）
+    pixels()は描画先そのもの，gray()は縮小したグレースケールのSurfaceのビューを返す
+    """
+    def __init__(self, screen: pg.Surface, size: tuple[int, int] | None = None):
+        """
+        引数1 screen：描画先のSurface
+        引数2 size：グレースケールの観測の大きさ（Noneならgray()は使えない）
+        """
+        if np is None:
+            raise ImportError("FrameObserverにはNumPyが必要です（pip install numpy）")
+        self.screen = screen
+        self.size = size
+        self.view: "np.ndarray | None" = None
+        if size is not None:
+            self.small = pg.Surface(size, 0, screen)  # 縮小したフレーム
+            self.gray_img = pg.Surface(size, 0, screen)  # 縮小したフレームのグレースケール
+            # R=G=Bなので赤の面だけを(高さ, 幅)で見る（transformの書き込み先はロック中でもよいので，ビューは使い回せる）
+            self.view = pg.surfarray.pixels_red(self.gray_img).T
+
+    def pixels(self) -> "np.ndarray":
+        """
+        描画先の画素をコピーせずに返す
+        配列がある間は描画先がロックされてblitできないので，次の描画の前に手放すこと
+        戻り値：(幅, 高さ, 3)のuint8配列（描画先のビュー）
+        """
+        return pg.surfarray.pixels3d(self.screen)
+
+    def gray(self) -> "np.ndarray":
+        """
+        描画先を縮小してグレースケールにし，その画素をコピーせずに返す
+        （毎回同じ配列を上書きするので，残しておく場合は呼び出し側でコピーする）
+        戻り値：(高さ, 幅)のuint8配列
+        """
+        if self.view is None:
+            raise ValueError("グレースケールの観測にはsizeの指定が必要です")
+        pg.transform.smoothscale(self.screen, self.size, self.small)
+        pg.transform.grayscale(self.small, self.gray_img)
+        return self.view
+
+
+class FrameCapture:
+    """
+    メインループで描画したフレームを受け取り，別スレッドでファイルに書き出すクラス
+    フレームは上限つきのキューで渡し，書き出しが追いつかないときは待たずにそのフレームを捨てる
+    format="raw"なら1つのファイルを枠に分けて古いフレームから上書きし（直近slotsフレームが残る），
+    format="png"ならディレクトリにフレームごとのPNGを書き出す
+    （PNGはpg.image.saveだとGILを持ったまま圧縮してメインループを止めるので，GILを離すzlibで自前で作る）
+    """
+    magic = b"KKCP"  # rawファイルの識別子
+    header = struct.Struct("<4siii")  # 識別子，幅，高さ，枠の数
+    slot_header = struct.Struct("<qq")  # 各枠の先頭：描画したフレームの通し番号（未使用の枠は-1），ロジックのフレーム番号
+    pixel_format = "RGBX"  # 取り込む画素の形式（RGBよりtobytesが速い）
+
+    def __init__(self, path: str, format: str = "raw", size: tuple[int, int] = (WIDTH, HEIGHT),
+                 slots: int = 250, maxsize: int = 8):
+        """
+        引数1 path：rawなら書き出すファイル，pngなら書き出すディレクトリのパス
+        引数2 format：書き出す形式（"raw"または"png"）
+        引数3 size：フレームの大きさ
+        引数4 slots：rawファイルに残すフレームの数
+        引数5 maxsize：書き出し待ちのフレームの上限（超えたフレームは捨てる）
+        """
+        if format not in ("raw", "png"):
+            raise ValueError(f"format={format!r}はrawかpngを指定してください")
+        if slots < 1:
+            raise ValueError(f"slots={slots}は1以上を指定してください")
+        self.path = path
+        self.format = format
+        self.size = size
+        self.slots = slots
+        self.frame_size = size[0]*size[1]*len(__class__.pixel_format)
+        self.frames: queue.Queue[tuple[int, int, bytes] | None] = queue.Queue(maxsize)  # 書き出し待ちの(通し番号, tmr, 画素)
+        self.drawn = 0  # grabに渡されたフレームの数（捨てたフレームも数えるので，通し番号は重複しない）
+        self.captured = 0  # キューに入れたフレームの数
+        self.dropped = 0  # キューがいっぱいで捨てたフレームの数
+        self.written = 0  # 書き出したフレームの数
+        self.failed = 0  # キューに入れたが書き出せなかったフレームの数（ワーカースレッドだけが数える）
+        self.error: str | None = None  # 書き出しで起きたエラー（起きたら以降のフレームは受け取らない）
+        if format == "raw":
+            self.file = open(path, "wb")
+            self.file.write(__class__.header.pack(__class__.magic, *size, slots))
+            for i in range(slots):  # すべての枠を未使用にしておく
+                self.file.seek(self.offset(i))
+                self.file.write(__class__.slot_header.pack(-1, -1))
+        else:
+            self.file = None
+            os.makedirs(path, exist_ok=True)
+        self.thread = threading.Thread(target=self._run, name="FrameCapture", daemon=True)
+        self.thread.start()
+
+    def offset(self, index: int) -> int:
+        """
+        rawファイルの枠の位置を返す
+        引数 index：枠の番号
+        戻り値：ファイルの先頭からのバイト数
+        """
+        return __class__.header.size+index*(__class__.slot_header.size+self.frame_size)
+
+    def grab(self, screen: pg.Surface, tmr: int) -> bool:
+        """
+        フレームの画素をキューに入れる（キューがいっぱいなら取り込まずに捨てる）
+        ロジックを進めずに描き直したフレームはtmrが同じになるので，描画したフレームの通し番号も付ける
+        引数1 screen：描画したSurface
+        引数2 tmr：ロジックのフレーム番号
+        戻り値：キューに入れたか
+        """
+        frame = self.drawn
+        self.drawn += 1
+        if self.error is not None or self.frames.full():  # 取り込みの手間もかけずに捨てる
+            self.dropped += 1
+            return False
+        try:
+            self.frames.put_nowait((frame, tmr, pg.image.tobytes(screen, __class__.pixel_format)))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.captured += 1
+        return True
+
+    def _run(self):
+        """
+        ワーカースレッドの処理：キューのフレームを順に書き出す（Noneで終了）
+        書き出しでエラーが起きても終了せず，closeまでキューを空にし続ける（メインループを待たせない）
+        """
+        while True:
+            item = self.frames.get()
+            if item is None:
+                return
+            if self.error is not None:  # エラーの後に残っていたフレームは捨てる
+                self.failed += 1
+                continue
+            frame, tmr, pixels = item
+            try:
+                if self.file is not None:
+                    self.file.seek(self.offset(self.written % self.slots))
+                    self.file.write(__class__.slot_header.pack(frame, tmr))
+                    self.file.write(pixels)
+                else:
+                    with open(os.path.join(self.path, f"frame_{frame:06d}_t{tmr:06d}.png"), "wb") as f:
+                        f.write(__class__.encode_png(pixels, self.size))
+            except Exception as e:
+                self.error = f"{type(e).__name__}: {e}"
+                self.failed += 1
+                continue
+            self.written += 1
+
+    @classmethod
+    def encode_png(cls, pixels: bytes, size: tuple[int, int]) -> bytes:
+        """
+        取り込んだ画素をPNGにする（圧縮は速さ優先のレベル1）
+        引数1 pixels：pixel_formatの画素のバイト列
+        引数2 size：フレームの大きさ
+        戻り値：PNGファイルの中身
+        """
+        w, h = size
+        rgb = pg.image.tobytes(pg.image.frombuffer(pixels, size, cls.pixel_format), "RGB")
+        stride = w*3
+        rows = b"".join(b"\x00"+rgb[y*stride:(y+1)*stride] for y in range(h))  # 各行の先頭はフィルタなし（0）
+
+        def chunk(tag: bytes, data: bytes) -> bytes:
+            return struct.pack(">I", len(data))+tag+data+struct.pack(">I", zlib.crc32(tag+data))
+
+        return (b"\x89PNG\r\n\x1a\n"
+                + chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0))  # 8ビットRGB
+                + chunk(b"IDAT", zlib.compress(rows, 1))
+                + chunk(b"IEND", b""))
+
+    def stats(self) -> dict[str, int | str | None]:
+        """
+        取り込みの状況を返す
+        戻り値：grabに渡された数，キューに入れた数，捨てた数，書き出した数，書き出せなかった数，
+                書き出しのエラー（なければNone）の辞書
+        """
+        return {"drawn": self.drawn, "captured": self.captured, "dropped": self.dropped, "written": self.written,
+                "failed": self.failed, "error": self.error}
+
+    def close(self):
+        """
+        書き出し待ちのフレームをすべて書き出してからワーカースレッドを終了する
+        （ワーカースレッドが止まっていても，終了の合図を待ち続けない）
+        """
+        while self.thread.is_alive():
+            try:
+                self.frames.put(None, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        self.thread.join()
+        if self.file is not None:
+            self.file.close()
+
+    @classmethod
+    def read(cls, path: str) -> list[tuple[int, int, pg.Surface]]:
+        """
+        rawファイルに残っているフレームを読み込む
+        引数 path：rawファイルのパス
+        戻り値：(描画したフレームの通し番号, ロジックのフレーム番号, Surface)の通し番号順のリスト
+        """
+        frames = []
+        with open(path, "rb") as f:
+            magic, w, h, slots = cls.header.unpack(f.read(cls.header.size))
+            if magic != cls.magic:
+                raise ValueError(f"{path}はFrameCaptureのファイルではありません")
+            frame_size = w*h*len(cls.pixel_format)
+            for _ in range(slots):
+                frame, tmr = cls.slot_header.unpack(f.read(cls.slot_header.size))
+                pixels = f.read(frame_size)
+                if frame >= 0 and len(pixels) == frame_size:
+                    frames.append((frame, tmr, pg.image.frombytes(pixels, (w, h), cls.pixel_format)))
+        frames.sort(key=lambda item: item[0])
+        return frames
+
+
+class SpritePool:
+    """
+    killされたスプライトを捨てずに保持し，次の生成時にreset()して再利用するプール
+    """
+    def __init__(self, cls: type, cap: int = 256):
+        """
+        引数1 cls：プールするスプライトのクラス（reset()を持つPooledSprite）
+        引数2 cap：保持する待機スプライトの上限
+        """
+        self.cls = cls
+        self.cap = cap
+        self.free: list[pg.sprite.Sprite] = []  # 再利用待ちのスプライト
+        self.active = 0  # 使用中のスプライト数
+        self.created = 0  # 新しく生成した回数
+        self.reused = 0  # 再利用した回数
+
+    def acquire(self, *args) -> pg.sprite.Sprite:
+        """
+        スプライトを取り出す（待機中のものがなければ生成する）
+        引数：clsの__init__/reset()と同じ引数
+        戻り値：初期化済みのスプライト
+        """
+        if self.free:
+            spr = self.free.pop()
+            spr.reset(*args)
+            self.reused += 1
+        else:
+            spr = self.cls(*args)
+            self.created += 1
+        spr.pool = self
+        self.active += 1
+        return spr
+
+    def release(self, spr: pg.sprite.Sprite):
+        """
+        killされたスプライトを待機リストに戻す（上限を超えた分は捨てる）
+        引数 spr：戻すスプライト
+        """
+        self.active -= 1
+        if len(self.free) < self.cap:
+            self.free.append(spr)
+
+    def occupancy(self) -> dict[str, int]:
+        """
+        プールの使用状況を返す
+        戻り値：使用中，待機中，上限，生成回数，再利用回数の辞書
+        """
+        return {"active": self.active, "free": len(self.free), "cap": self.cap,
+                "created": self.created, "reused": self.reused}
+
+
+class PooledSprite(pg.sprite.Sprite):
+    """
+    SpritePoolから取り出されたときに，kill()でプールへ戻るスプライト
+    """
+    pool: SpritePool | None = None  # 取り出し元のプール
+
+    def kill(self):
+        super().kill()
+        pool, self.pool = self.pool, None
+        if pool is not None:  # 二重にkillされても一度だけ戻す
+            pool.release(self)
+
+
 class Bird(pg.sprite.Sprite):
     """
     ゲームキャラクター（こうかとん）に関するクラス
@@ -64,6 +887,33 @@ class Bird(pg.sprite.Sprite):
         pg.K_RIGHT: (+1, 0),
     }
 
+    tables: dict[int, dict[tuple[int, int], pg.Surface]] = {}  # 画像番号ごとの，向きと画像の辞書
+
+    @classmethod
+    def get_table(cls, num: int) -> dict[tuple[int, int], pg.Surface]:
+        """
+        8方向の向きとこうかとん画像の辞書を返す（画像番号ごとに初回のみ作り，以降は共有する）
+        引数 num：こうかとん画像ファイル名の番号
+        戻り値：向きのタプルをキー，画像Surfaceを値とする辞書
+        """
+        table = cls.tables.get(num)
+        if table is None:
+            path = f"{MAIN_DIR}/fig/{num}.png"
+            img0 = Assets.get(path, 2.0)
+            img = Assets.get(path, 2.0, flip=(True, False))  # デフォルトのこうかとん
+            # 拡大済みの画像を回転する（Assets.getの拡大と回転を1回で行う画像とは画素が異なる）
+            table = cls.tables[num] = {
+                (+1, 0): img,  # 右
+                (+1, -1): pg.transform.rotozoom(img, 45, 1.0),  # 右上
+                (0, -1): img,  # 上
+                (-1, -1): pg.transform.rotozoom(img0, -45, 1.0),  # 左上
+                (-1, 0): img0,  # 左
+                (-1, +1): pg.transform.rotozoom(img0, 45, 1.0),  # 左下
+                (0, +1): pg.transform.rotozoom(img, -90, 1.0),  # 下
+                (+1, +1): pg.transform.rotozoom(img, -45, 1.0),  # 右下
+            }
+        return table
+
     def __init__(self, num: int, xy: tuple[int, int]):
         """
         こうかとん画像Surfaceを生成する
@@ -71,40 +921,28 @@ class Bird(pg.sprite.Sprite):
         引数2 xy：こうかとん画像の位置座標タプル
         """
         super().__init__()
-        img0 = pg.transform.rotozoom(pg.image.load(f"{MAIN_DIR}/fig/{num}.png"), 0, 2.0)
-        img = pg.transform.flip(img0, True, False)  # デフォルトのこうかとん
-        self.imgs = {
-            (+1, 0): img,  # 右
-            (+1, -1): pg.transform.rotozoom(img, 45, 1.0),  # 右上
-            (0, -1): img,  # 上
-            (-1, -1): pg.transform.rotozoom(img0, -45, 1.0),  # 左上
-            (-1, 0): img0,  # 左
-            (-1, +1): pg.transform.rotozoom(img0, 45, 1.0),  # 左下
-            (0, +1): pg.transform.rotozoom(img, -90, 1.0),  # 下
-            (+1, +1): pg.transform.rotozoom(img, -45, 1.0),  # 右下
-        }
+        self.imgs = __class__.get_table(num)  # 全インスタンスで共有する
         self.dire = (+1, 0)
         self.image = self.imgs[self.dire]
         self.rect = self.image.get_rect()
         self.rect.center = xy
         self.speed = 10
+        self.mv_field = False  # スクロールの許可
+        self.mv_move = False  # 移動の許可
+        self.fly_count = 0  # 飛翔時間のカウント
 
-    def change_img(self, num: int, screen: pg.Surface):
+    def change_img(self, num: int):
         """
-        こうかとん画像を切り替え，画面に転送する
-        引数1 num：こうかとん画像ファイル名の番号
-        引数2 screen：画面Surface
+        こうかとん画像を切り替える（描画はGame.drawで行う）
+        引数 num：こうかとん画像ファイル名の番号
         """
-        self.image = pg.transform.rotozoom(pg.image.load(f"{MAIN_DIR}/fig/{num}.png"), 0, 2.0)
-        screen.blit(self.image, self.rect)
+        self.image = Assets.get(f"{MAIN_DIR}/fig/{num}.png", 2.0)
 
-    def update(self, key_lst: list[bool], screen: pg.Surface):
+    def update(self, key_lst: list[bool]):
         """
         押下キーに応じてこうかとんを移動させる
-        引数1 key_lst：押下キーの真理値リスト
-        引数2 screen：画面Surface
+        引数 key_lst：押下キーの真理値リスト
         """
-        global MV_FIELD,FLY_COUNT,MV_MOVE
         sum_mv = [0, 0]
         moto_center = self.rect.center
         for k, mv in __class__.delta.items():
@@ -113,22 +951,22 @@ class Bird(pg.sprite.Sprite):
                 sum_mv[0] += mv[0]
                 sum_mv[1] += mv[1]
                 if k == pg.K_UP:
-                    FLY_COUNT += 1
-                    if 20 <= FLY_COUNT < 35:
+                    self.fly_count += 1
+                    if 20 <= self.fly_count < 35:
                         self.rect.move_ip(-self.speed*mv[0], -self.speed*mv[1])
-                        MV_MOVE = False
-                    elif 35 <= FLY_COUNT:
-                        FLY_COUNT = 0
+                        self.mv_move = False
+                    elif 35 <= self.fly_count:
+                        self.fly_count = 0
         self.rect.move_ip(0,2)
         if check_bound(self.rect) != (True, True):
             for k, mv in __class__.delta.items():
                 if key_lst[k]:
                     self.rect.move_ip(-self.speed*mv[0], -self.speed*mv[1])
-                    MV_MOVE = False
+                    self.mv_move = False
         if self.rect.right > WIDTH/13*5:   #画面推移のための線引き
             self.rect.move_ip(-self.speed*mv[0],0)
-            MV_FIELD = True
-        if MV_MOVE == True:
+            self.mv_field = True
+        if self.mv_move == True:
             for k, mv in __class__.delta.items():
                 if key_lst[k]:
                     self.rect.move_ip(-self.speed*mv[0], -self.speed*mv[1])
@@ -136,23 +974,33 @@ class Bird(pg.sprite.Sprite):
         if not (sum_mv[0] == 0 and sum_mv[1] == 0):
             self.dire = tuple(sum_mv)
             self.image = self.imgs[self.dire]
-        screen.blit(self.image, self.rect)
 
 
-class Bomb(pg.sprite.Sprite):
+class Bomb(PooledSprite):
     """
     爆弾に関するクラス
     """
     #colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), (255, 0, 255), (0, 255, 255)]
 
-    def __init__(self, emy: "ghost", bird: Bird):
+    world = True  # ワールド座標で管理する
+    speed = 6  # 爆弾の速さ（バランス調整用）
+
+    def __init__(self, emy: "ghost", bird: Bird, camera: Camera):
         """
         爆弾円Surfaceを生成する
         引数1 emy：爆弾を投下する敵機
         引数2 bird：攻撃対象のこうかとん
+        引数3 camera：スクロールを管理するカメラ
         """
         super().__init__()
-        self.image = pg.transform.rotozoom(pg.image.load(f"{MAIN_DIR}/fig/fire.png"), 0, 0.1)  #bombを火の玉に変更
+        self.reset(emy, bird, camera)
+
+    def reset(self, emy: "ghost", bird: Bird, camera: Camera):
+        """
+        プールから再利用するときに，生成時と同じ状態に初期化する
+        引数：__init__と同じ
+        """
+        self.image = Assets.get(f"{MAIN_DIR}/fig/fire.png", 0.1)  #bombを火の玉に変更
         #rad = random.randint(10, 50)  # 爆弾円の半径：10以上50以下の乱数
         #color = random.choice(__class__.colors)  # 爆弾円の色：クラス変数からランダム選択
         #self.image = pg.Surface((2*rad, 2*rad))
@@ -161,75 +1009,123 @@ class Bomb(pg.sprite.Sprite):
         self.rect = self.image.get_rect()
         # 爆弾を投下するemyから見た攻撃対象のbirdの方向を計算
         self.vx, self.vy = calc_orientation(emy.rect, bird.rect)
-        self.rect.centerx = emy.rect.centerx
+        self.rect.centerx = emy.rect.centerx+camera.x  # 画面座標からワールド座標へ
         self.rect.centery = emy.rect.centery+emy.rect.height/2
-        self.speed = 6
+        self.speed = __class__.speed
 
-    def update(self):
+    def update(self, camera: Camera):
         """
         爆弾を速度ベクトルself.vx, self.vyに基づき移動させる
-        引数 screen：画面Surface
+        引数 camera：スクロールを管理するカメラ
         """
-        if MV_FIELD == True:
-            self.rect.move_ip(-5,0)
         self.rect.move_ip(+self.speed*self.vx, +self.speed*self.vy)
-        if check_bound(self.rect) != (True, True):
+        if check_bound(camera.apply(self.rect)) != (True, True):
             self.kill()
 
 
-class Funn(pg.sprite.Sprite):
+class Funn(PooledSprite):
     """
     爆弾に関するクラス
     """
     colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), (255, 0, 255), (0, 255, 255)]
+    imgs: dict[tuple[int, tuple[int, int, int]], pg.Surface] = {}  # (半径, 色)ごとに共有する爆弾円Surface
+
+    world = True  # ワールド座標で管理する
+    speed = 6  # 糞の速さ（バランス調整用）
+
+    @classmethod
+    def get_img(cls, rad: int, color: tuple[int, int, int]) -> pg.Surface:
+        """
+        爆弾円Surfaceを返す（初回のみ描画し，以降は全インスタンスで共有する）
+        引数1 rad：爆弾円の半径
+        引数2 color：爆弾円の色
+        戻り値：爆弾円Surface
+        """
+        img = cls.imgs.get((rad, color))
+        if img is None:
+            img = pg.Surface((2*rad, 2*rad))
+            pg.draw.circle(img, color, (rad, rad), rad)
+            img.set_colorkey((0, 0, 0), pg.RLEACCEL)  # 透過色の多い画像はRLEで速く描ける
+            cls.imgs[(rad, color)] = img
+        return img
+
+    @classmethod
+    def prerender(cls):
+        """
+        半径10～50と全色の組み合わせ（41×6通り）を起動時にまとめて描画しておく
+        """
+        for rad in range(10, 51):
+            for color in cls.colors:
+                cls.get_img(rad, color)
 
-    def __init__(self, emy: "Enemy", bird: Bird):
+    def __init__(self, emy: "Enemy", bird: Bird, camera: Camera, rng=random):
         """
         爆弾円Surfaceを生成する
         引数1 emy：爆弾を投下する敵機
         引数2 bird：攻撃対象のこうかとん
+        引数3 camera：スクロールを管理するカメラ
+        引数4 rng：ゲームの乱数（random.Random．省略時はrandomモジュール）
         """
         super().__init__()
+        self.reset(emy, bird, camera, rng)
+
+    def reset(self, emy: "Enemy", bird: Bird, camera: Camera, rng=random):
+        """
+        プールから再利用するときに，生成時と同じ状態に初期化する
+        引数：__init__と同じ
+        """
         #self.image = pg.transform.rotozoom(pg.image.load(f"{MAIN_DIR}/fig/funn.png"), 0, 0.2)  #bombを火の玉に変更
-        rad = random.randint(10, 50)  # 爆弾円の半径：10以上50以下の乱数
-        color = random.choice(__class__.colors)  # 爆弾円の色：クラス変数からランダム選択
-        self.image = pg.Surface((2*rad, 2*rad))
-        pg.draw.circle(self.image, color, (rad, rad), rad)
-        self.image.set_colorkey((0, 0, 0))
+        rad = rng.randint(10, 50)  # 爆弾円の半径：10以上50以下の乱数
+        color = rng.choice(__class__.colors)  # 爆弾円の色：クラス変数からランダム選択
+        self.image = __class__.get_img(rad, color)  # 描画済みのSurfaceを共有する
         self.rect = self.image.get_rect()
         # 爆弾を投下するemyから見た攻撃対象のbirdの方向を計算
         self.vx, self.vy = calc_orientation(emy.rect, bird.rect)
-        self.rect.centerx = emy.rect.centerx
+        self.rect.centerx = emy.rect.centerx+camera.x  # 画面座標からワールド座標へ
         self.rect.centery = emy.rect.centery+emy.rect.height/2
-        self.speed = 6
+        self.speed = __class__.speed
 
-    def update(self):
+    def update(self, camera: Camera):
         """
         爆弾を速度ベクトルself.vx, self.vyに基づき移動させる
-        引数 screen：画面Surface
+        引数 camera：スクロールを管理するカメラ
         """
-        if MV_FIELD == True:
-            self.rect.move_ip(-5,0)
         self.rect.move_ip(+self.speed*self.vx, +self.speed*self.vy)
-        if check_bound(self.rect) != (True, True):
+        if check_bound(camera.apply(self.rect)) != (True, True):
             self.kill()
 
 
-class Beam(pg.sprite.Sprite):
+class Beam(PooledSprite):
     """
     ビームに関するクラス
     """
+    table: dict[tuple[int, int], tuple[pg.Surface, float, float]] = {}  # 向きごとの(画像, 単位ベクトルx, y)
+
+    @classmethod
+    def get_table(cls) -> dict[tuple[int, int], tuple[pg.Surface, float, float]]:
+        """
+        8方向の向きと(回転済みのビーム画像, 単位ベクトル)の辞書を返す（初回のみ作り，以降は共有する）
+        戻り値：向きのタプルをキー，(画像Surface, 単位ベクトルx, y)を値とする辞書
+        """
+        if not cls.table:
+            for dire, (angle, vx, vy) in DIRECTIONS.items():
+                cls.table[dire] = Assets.get(f"{MAIN_DIR}/fig/beam.png", 2.0, angle), vx, vy
+        return cls.table
+
     def __init__(self, bird: Bird):
         """
         ビーム画像Surfaceを生成する
         引数 bird：ビームを放つこうかとん
         """
         super().__init__()
-        self.vx, self.vy = bird.dire
-        angle = math.degrees(math.atan2(-self.vy, self.vx))
-        self.image = pg.transform.rotozoom(pg.image.load(f"{MAIN_DIR}/fig/beam.png"), angle, 2.0)
-        self.vx = math.cos(math.radians(angle))
-        self.vy = -math.sin(math.radians(angle))
+        self.reset(bird)
+
+    def reset(self, bird: Bird):
+        """
+        プールから再利用するときに，生成時と同じ状態に初期化する
+        引数：__init__と同じ
+        """
+        self.image, self.vx, self.vy = __class__.get_table()[bird.dire]  # 三角関数も回転もしない
         self.rect = self.image.get_rect()
         self.rect.centery = bird.rect.centery+bird.rect.height*self.vy
         self.rect.centerx = bird.rect.centerx+bird.rect.width*self.vx
@@ -245,21 +1141,33 @@ class Beam(pg.sprite.Sprite):
             self.kill()
 
 
-class Explosion(pg.sprite.Sprite):
+class Explosion(PooledSprite):
     """
     爆発に関するクラス
     """
-    def __init__(self, obj: "Funn|Enemy", life: int):
+    def __init__(self, obj: "Funn|Enemy|pg.Rect", life: int, camera: Camera):
         """
         爆弾が爆発するエフェクトを生成する
-        引数1 obj：カラスの糞攻撃またはカラスのインスタンス
+        引数1 obj：カラスの糞攻撃またはカラスのインスタンス（画面座標のRectでもよい）
         引数2 life：爆発時間
+        引数3 camera：スクロールを管理するカメラ
         """
         super().__init__()
-        img = pg.image.load(f"{MAIN_DIR}/fig/explosion.gif")
-        self.imgs = [img, pg.transform.flip(img, 1, 1)]
+        self.reset(obj, life, camera)
+
+    def reset(self, obj: "Funn|Enemy|pg.Rect", life: int, camera: Camera):
+        """
+        プールから再利用するときに，生成時と同じ状態に初期化する
+        引数：__init__と同じ
+        """
+        path = f"{MAIN_DIR}/fig/explosion.gif"
+        self.imgs = [Assets.get(path), Assets.get(path, flip=(True, True))]
         self.image = self.imgs[0]
-        self.rect = self.image.get_rect(center=obj.rect.center)
+        if isinstance(obj, pg.Rect):  # ProjectileArrayの弾は画面座標のRectで渡される
+            center = obj.center
+        else:
+            center = camera.screen_rect(obj).center
+        self.rect = self.image.get_rect(center=center)
         self.life = life
 
     def update(self):
@@ -273,23 +1181,215 @@ class Explosion(pg.sprite.Sprite):
             self.kill()
 
 
+class ProjectileArray:
+    """
+    爆弾（bomb）とカラスの糞（funn）を，1個ずつのスプライトではなくNumPy配列でまとめて持つクラス
+    移動，画面外の削除，衝突判定を配列演算で一度に行い，描画用の(Surface, 位置)もまとめて作る
+    （座標と移動量は整数のままなので，スプライト版のBomb/Funnと同じ動きになる）
+    """
+    kinds = ("bomb", "funn")  # 弾の種類（配列には添字で持つ）
+    chunk = 256  # groupcollideで一度に判定するスプライトの数（判定に使う行列の大きさを抑える）
+
+    def __init__(self, cap: int = 1024):
+        """
+        引数 cap：最初に確保する弾の数（足りなくなったら倍にする）
+        """
+        if np is None:
+            raise ImportError("ProjectileArrayにはNumPyが必要です（pip install numpy）")
+        self.n = 0  # 使用中の弾の数（配列の先頭n個が有効）
+        self.pos = np.zeros((cap, 2), dtype=np.int64)  # 左上のワールド座標
+        self.vel = np.zeros((cap, 2), dtype=np.int64)  # 1フレームの移動量
+        self.size = np.zeros((cap, 2), dtype=np.int64)  # 幅と高さ
+        self.kind = np.zeros(cap, dtype=np.int8)  # kindsの添字
+        self.img = np.zeros(cap, dtype=np.int32)  # imagesの添字
+        self.images: list[pg.Surface] = []  # 弾の画像Surface（同じ画像は共有する）
+        self.img_ids: dict[int, int] = {}  # id(Surface)からimagesの添字への辞書
+
+    def __len__(self) -> int:
+        return self.n
+
+    def count(self, kind: str) -> int:
+        """
+        指定した種類の弾の数を返す
+        引数 kind：弾の種類（"bomb"または"funn"）
+        戻り値：弾の数
+        """
+        return int(np.count_nonzero(self.kind[:self.n] == __class__.kinds.index(kind)))
+
+    def _grow(self):
+        """
+        配列の大きさを倍にする
+        """
+        cap = 2*len(self.kind)
+        for name in ("pos", "vel", "size", "kind", "img"):
+            old = getattr(self, name)
+            new = np.zeros((cap,)+old.shape[1:], dtype=old.dtype)
+            new[:self.n] = old[:self.n]
+            setattr(self, name, new)
+
+    def _keep(self, keep):
+        """
+        keepがTrueの弾だけを順番を保ったまま前に詰める
+        引数 keep：先頭n個の弾を残すかどうかの真理値配列
+        """
+        k = int(np.count_nonzero(keep))
+        for arr in (self.pos, self.vel, self.size, self.kind, self.img):
+            arr[:k] = arr[:self.n][keep]
+        self.n = k
+
+    def spawn(self, kind: str, image: pg.Surface, rect: pg.Rect, vx: int, vy: int):
+        """
+        弾を1個追加する
+        引数1 kind：弾の種類（"bomb"または"funn"）
+        引数2 image：弾の画像Surface
+        引数3 rect：弾のワールド座標のRect
+        引数4 vx：1フレームの横方向の移動量
+        引数5 vy：1フレームの縦方向の移動量
+        """
+        if self.n == len(self.kind):
+            self._grow()
+        idx = self.img_ids.get(id(image))
+        if idx is None:
+            idx = self.img_ids[id(image)] = len(self.images)
+            self.images.append(image)
+        i = self.n
+        self.pos[i] = rect.left, rect.top
+        self.vel[i] = vx, vy
+        self.size[i] = rect.width, rect.height
+        self.kind[i] = __class__.kinds.index(kind)
+        self.img[i] = idx
+        self.n += 1
+
+    def fire(self, kind: str, image: pg.Surface, emy: pg.Rect, bird: pg.Rect, camera: Camera, speed: int = 6):
+        """
+        Bomb/Funnと同じ位置と向きで，敵機からこうかとんへ向けて弾を撃つ
+        引数1 kind：弾の種類（"bomb"または"funn"）
+        引数2 image：弾の画像Surface
+        引数3 emy：弾を投下する敵機のRect
+        引数4 bird：攻撃対象のこうかとんのRect
+        引数5 camera：スクロールを管理するカメラ
+        引数6 speed：弾の速さ
+        """
+        vx, vy = calc_orientation(emy, bird)
+        rect = image.get_rect()
+        rect.centerx = emy.centerx+camera.x  # 画面座標からワールド座標へ
+        rect.centery = emy.centery+emy.height/2
+        self.spawn(kind, image, rect, int(speed*vx), int(speed*vy))  # move_ipと同じく0方向へ切り捨てる
+
+    def _boxes(self, camera: Camera):
+        """
+        全弾の画面座標の左端，上端，右端，下端を返す
+        引数 camera：スクロールを管理するカメラ
+        戻り値：左端，上端，右端，下端の配列のタプル
+        """
+        left = self.pos[:self.n, 0]-camera.x
+        top = self.pos[:self.n, 1]
+        return left, top, left+self.size[:self.n, 0], top+self.size[:self.n, 1]
+
+    def step(self, camera: Camera):
+        """
+        全弾を1フレーム分動かし，画面からはみ出した弾を消す
+        引数 camera：スクロールを管理するカメラ
+        """
+        self.pos[:self.n] += self.vel[:self.n]
+        left, top, right, bottom = self._boxes(camera)
+        inside = (0 <= left) & (right <= WIDTH) & (0 <= top) & (bottom <= HEIGHT)  # check_boundと同じ判定
+        if not inside.all():
+            self._keep(inside)
+
+    def groupcollide(self, kind: str, group: pg.sprite.AbstractGroup, camera: Camera) -> list[pg.Rect]:
+        """
+        指定した種類の弾とグループの衝突を判定し，ぶつかった弾とスプライトを両方消す
+        （pg.sprite.groupcollide(弾, group, True, True)と同じく，スプライトは最初にぶつかった弾だけを消す）
+        引数1 kind：弾の種類（"bomb"または"funn"）
+        引数2 group：衝突相手のグループ（ビームなど）
+        引数3 camera：スクロールを管理するカメラ
+        戻り値：消えた弾の画面座標のRectのリスト
+        """
+        sprites = group.sprites()
+        sel = np.flatnonzero(self.kind[:self.n] == __class__.kinds.index(kind))
+        if not sprites or len(sel) == 0:
+            return []
+        left, top, right, bottom = (a[sel] for a in self._boxes(camera))
+        rects = [camera.screen_rect(spr) for spr in sprites]
+        other = np.array([(r.left, r.top, r.right, r.bottom) for r in rects], dtype=np.int64).reshape(-1, 4)
+        # x方向のsweep and prune：弾とスプライトを左端で並べ，x方向に重なりうる範囲の弾とだけ判定する
+        by_x = np.argsort(left, kind="stable")
+        lefts = left[by_x]
+        max_w = int((right-left).max())
+        spr_by_x = np.argsort(other[:, 0], kind="stable")
+        first_hit = np.full(len(sprites), len(sel))  # スプライトごとの最初にぶつかった弾（弾の順，なければlen(sel)）
+        for c in range(0, len(sprites), __class__.chunk):
+            js = spr_by_x[c:c+__class__.chunk]
+            box = other[js]
+            lo = np.searchsorted(lefts, int(box[:, 0].min())-max_w, "right")  # 右端がスプライトの左端より右の候補
+            hi = np.searchsorted(lefts, int(box[:, 2].max()), "left")  # 左端がスプライトの右端より左の候補
+            if lo >= hi:
+                continue
+            cand = by_x[lo:hi]
+            hit = ((left[cand, None] < box[:, 2]) & (box[:, 0] < right[cand, None]) &
+                   (top[cand, None] < box[:, 3]) & (box[:, 1] < bottom[cand, None]))  # 候補の弾×スプライトの重なり
+            first_hit[js] = np.where(hit, cand[:, None], len(sel)).min(axis=0)
+        struck = np.flatnonzero(first_hit < len(sel))  # 弾にぶつかったスプライト
+        if len(struck) == 0:
+            return []
+        first = np.unique(first_hit[struck])  # 各スプライトに最初にぶつかった弾
+        for j in struck.tolist():
+            sprites[j].kill()
+        dead = sel[first]
+        killed = [pg.Rect(int(x)-camera.x, int(y), int(w), int(h))
+                  for (x, y), (w, h) in zip(self.pos[dead], self.size[dead])]
+        keep = np.ones(self.n, dtype=bool)
+        keep[dead] = False
+        self._keep(keep)
+        return killed
+
+    def spritecollide(self, kind: str, rect: pg.Rect, camera: Camera) -> int:
+        """
+        指定した種類の弾のうち，画面座標のrectにぶつかったものを消す
+        引数1 kind：弾の種類（"bomb"または"funn"）
+        引数2 rect：衝突相手の画面座標のRect（こうかとんなど）
+        引数3 camera：スクロールを管理するカメラ
+        戻り値：消えた弾の数
+        """
+        left, top, right, bottom = self._boxes(camera)
+        hit = ((self.kind[:self.n] == __class__.kinds.index(kind)) &
+               (left < rect.right) & (rect.left < right) & (top < rect.bottom) & (rect.top < bottom))
+        count = int(np.count_nonzero(hit))
+        if count:
+            self._keep(~hit)
+        return count
+
+    def blit_list(self, camera: Camera) -> list[tuple[pg.Surface, tuple[int, int]]]:
+        """
+        全弾の(画像Surface, 画面座標)のリストを返す（Surface.blitsにそのまま渡せる．画面外の弾はstepで消えている）
+        引数 camera：スクロールを管理するカメラ
+        戻り値：(画像Surface, 左上の画面座標)のリスト
+        """
+        images = self.images
+        xs = (self.pos[:self.n, 0]-camera.view_x).tolist()
+        ys = self.pos[:self.n, 1].tolist()
+        return [(images[i], (x, y)) for i, x, y in zip(self.img[:self.n].tolist(), xs, ys)]
+
+
 class Ghost(pg.sprite.Sprite):
     """
     ゴーストに関するクラス
     """
     #imgs = [pg.image.load(f"{MAIN_DIR}/fig/alien{i}.png") for i in range(1, 4)]
-    img = pg.transform.rotozoom(pg.image.load(f"{MAIN_DIR}/fig/ghost.png"), 0, 0.3)
-    def __init__(self,tmr):
+    interval_range = (150, 400)  # 爆弾投下インターバルの範囲（バランス調整用）
+
+    def __init__(self,tmr,rng=random):
         super().__init__()
-        self.image = __class__.img
+        self.image = Assets.get(f"{MAIN_DIR}/fig/ghost.png", 0.3)  # 画面生成後に読み込み，表示形式に変換する
         self.rect = self.image.get_rect()
-        self.rect.center = random.randint(700, WIDTH), 100
+        self.rect.center = rng.randint(700, WIDTH), 100
         self.vy = +6
         self.vx = -100
-        self.bound_x = random.randint(70, WIDTH/2)
-        self.bound_y = random.randint(10, HEIGHT/2)  # 停止位置
+        self.bound_x = rng.randint(70, WIDTH/2)
+        self.bound_y = rng.randint(10, HEIGHT/2)  # 停止位置
         self.state = "down"  # 降下状態or停止状態
-        self.interval = random.randint(150, 400)  # 爆弾投下インターバル
+        self.interval = rng.randint(*__class__.interval_range)  # 爆弾投下インターバル
         self.time=tmr
         
     def update(self,tmr):
@@ -310,18 +1410,19 @@ class Enemy(pg.sprite.Sprite):
     tmr = 0
     i = 0
     
-    def __init__(self,arrive):
+    def __init__(self,arrive,rng=random):
         super().__init__()
-        img0 = pg.transform.rotozoom(pg.image.load(f"{MAIN_DIR}/fig/crow_1.png"), 0, 0.2)
-        img1 = pg.transform.rotozoom(pg.image.load(f"{MAIN_DIR}/fig/crow_2.png"), 0, 0.2)
+        img0 = Assets.get(fig_path("crow_1.png", "alien1.png"), 0.2)  # カラスの画像がなければエイリアンで代用
+        img1 = Assets.get(fig_path("crow_2.png", "alien2.png"), 0.2)
         self.crow_list = [img0,img1]
+        self.image = self.crow_list[arrive//10%2]  # 最初のupdate前に描画されてもよいように
         self.rect = self.crow_list[0].get_rect()
         self.rect.center = 1100, 0
         self.vy = +6
         self.vx = 0
         self.bound = 40  # 停止位置
         self.state = "down"  # 降下状態or停止状態
-        self.interval = random.randint(50, 300)  # 爆弾投下インターバル
+        self.interval = rng.randint(50, 300)  # 爆弾投下インターバル
         self.arrive = arrive
 
     def update(self):
@@ -372,6 +1473,56 @@ class Enemy(pg.sprite.Sprite):
 #         if check_bound(self.rect) != (True, True):
 #             self.kill()
 
+class GlyphAtlas:
+    """
+    描画済みの文字Surface（ラベルと1文字ずつの数字）を保持し，並べて文字列Surfaceを作るクラス
+    数値が変わるたびにfont.renderで文字列全体を描画し直さなくてよい
+    """
+    def __init__(self, font: pg.font.Font, color: tuple[int, int, int], antialias: bool,
+                 label: str = ""):
+        """
+        引数1 font：フォント
+        引数2 color：文字色
+        引数3 antialias：アンチエイリアスの有無
+        引数4 label：数値の前に付けるラベル（まとめて1枚で描画しておく）
+        """
+        self.font = font
+        self.color = color
+        self.antialias = antialias
+        self.label = label
+        self.glyphs: dict[str, pg.Surface] = {}
+        for ch in [label, *"0123456789"]:
+            self.glyph(ch)
+
+    def glyph(self, ch: str) -> pg.Surface:
+        """
+        文字Surfaceを返す（初回のみ描画する）
+        引数 ch：文字（ラベルの場合は文字列）
+        戻り値：文字Surface
+        """
+        img = self.glyphs.get(ch)
+        if img is None:
+            img = self.font.render(ch, self.antialias, self.color)
+            self.glyphs[ch] = img
+        return img
+
+    def render(self, text: str) -> pg.Surface:
+        """
+        ラベルと文字Surfaceを並べて文字列Surfaceを作る
+        引数 text：ラベルの後ろに並べる文字列
+        戻り値：文字列Surface
+        """
+        glyphs = [self.glyph(ch) for ch in [self.label, *text] if ch]
+        w = sum(g.get_width() for g in glyphs)
+        h = max((g.get_height() for g in glyphs), default=self.font.get_height())
+        image = pg.Surface((w, h), pg.SRCALPHA)
+        x = 0
+        for g in glyphs:
+            image.blit(g, (x, 0))
+            x += g.get_width()
+        return image
+
+
 class Score:
     """
     敵機の数をスコアとして表示するクラス
@@ -380,13 +1531,23 @@ class Score:
     def __init__(self):
         self.font = pg.font.Font(None, 50)
         self.color = (0, 0, 255)
+        self.atlas = GlyphAtlas(self.font, self.color, False, "Score: ")
         self.value = 0
-        self.image = self.font.render(f"Score: {self.value}", 0, self.color)
+        self.image = self.atlas.render(str(self.value))
+        self.rendered = self.value  # imageに描画済みの値
         self.rect = self.image.get_rect()
         self.rect.center = 100, HEIGHT-50
 
+    def render(self):
+        """
+        値が変わったときだけimageを描画し直す
+        """
+        if self.value != self.rendered:
+            self.image = self.atlas.render(str(self.value))
+            self.rendered = self.value
+
     def update(self, screen: pg.Surface):
-        self.image = self.font.render(f"Score: {self.value}", 0, self.color)
+        self.render()
         screen.blit(self.image, self.rect)
 
 
@@ -394,22 +1555,34 @@ class Coin(pg.sprite.Sprite):
     """
     コインに関するクラス
     """
+    world = True  # ワールド座標で管理する
+    img: pg.Surface | None = None  # 全コインで共有するSurface
+
+    @classmethod
+    def get_img(cls) -> pg.Surface:
+        """
+        コインのSurfaceを返す（初回のみ描画し，以降は全インスタンスで共有する）
+        戻り値：コインのSurface
+        """
+        if cls.img is None:
+            cls.img = pg.Surface((30,30))
+            pg.draw.circle(cls.img, (255,255,0),(15,15), 15)  #半径15の黄色のコイン
+            cls.img.set_colorkey((0, 0, 0), pg.RLEACCEL)  # 透過色の多い画像はRLEで速く描ける
+        return cls.img
+
     def __init__(self,x, y):
         super().__init__()
         self.x = x
         self.y = y
-        self.image = pg.Surface((30,30))
+        self.image = __class__.get_img()
         self.rect = self.image.get_rect(center=(x, y))
-        pg.draw.circle(self.image, (255,255,0),(15,15), 15)  #半径15の黄色のコイン
-        self.image.set_colorkey((0, 0, 0))
 
-    def update(self):
+    def update(self, camera: Camera):
         """
         コインと消去の更新に関する関数
+        引数 camera：スクロールを管理するカメラ
         """
-        if MV_FIELD == True:
-            self.rect.move_ip(-5,0)
-        if self.rect.right < 0:
+        if camera.apply(self.rect).right < 0:  # 画面左に消えたら削除
             self.kill()
 
 
@@ -417,10 +1590,13 @@ class Field(pg.sprite.Sprite):
     """
     足場に関するクラス
     """
+    world = True  # ワールド座標で管理する
+
     def __init__(self, left_L=100, top_L=HEIGHT-50, yoko=50, tate=50,color = (0,0,255)):
         """
         足場のsurfaceを作る関数
         引数：top_L(左上地点x座標),left_L(左上地点y座標),yoko(長さ),tate(高さ)
+        座標はワールド座標で指定する
         """
         super().__init__()
         self.left = left_L
@@ -431,16 +1607,244 @@ class Field(pg.sprite.Sprite):
         self.rect.left = left_L
         self.rect.centery = top_L
 
-    def update(self):
+    def update(self, camera: Camera):
         """
-        足場の移動と消去の更新に関する関数
+        足場の消去の更新に関する関数
+        引数 camera：スクロールを管理するカメラ
         """
-        if MV_FIELD:
-            self.rect.move_ip(-5,0)  #Fieldを動かす
-        if self.rect.right < 0:
+        if camera.apply(self.rect).right < 0:  # 画面左に消えたら削除
             self.kill()
 
 
+class LevelGenerator:
+    """
+    シード値から，チャンクごとにField・Death_Field・コインの配置を決めるクラス
+    配置済みの矩形をx方向の区間として左端順に持ち，x方向に重なりうる区間だけを調べて
+    互いに重ならない（間隔gap以上あける）ように置く
+    同じシード値とチャンク番号からは常に同じ配置になる
+    """
+    max_w = 500  # 物体の最大の幅（区間の探索範囲に使う）
+
+    def __init__(self, seed: int, chunk_w: int = WIDTH, gap: int = 20):
+        """
+        引数1 seed：シード値
+        引数2 chunk_w：チャンクの幅
+        引数3 gap：物体同士の最小の間隔
+        """
+        self.seed = seed
+        self.chunk_w = chunk_w
+        self.gap = gap
+
+    def chunk(self, index: int, goal: int = GOAL) -> list[tuple[str, pg.Rect]]:
+        """
+        チャンクの配置を決める（物体はすべてチャンクの中に収まるので，隣のチャンクとも重ならない）
+        引数1 index：チャンク番号
+        引数2 goal：ワールドの右端
+        戻り値：(種類, ワールド座標の矩形)のリスト（種類は"field", "death", "coin"）
+        """
+        rng = random.Random(f"{self.seed}:{index}")  # チャンクごとに独立した乱数
+        left = index*self.chunk_w
+        right = min(left+self.chunk_w, goal)
+        lefts: list[int] = []  # 配置済みの矩形の左端（昇順）
+        rects: list[pg.Rect] = []  # lefts と同じ順の配置済みの矩形
+        layout = []
+
+        def place(kind: str, make) -> bool:
+            for _ in range(20):  # 重なったら20回まで置き直す
+                rect = make()
+                if rect.left < left or right < rect.right:
+                    continue
+                area = rect.inflate(2*self.gap, 2*self.gap)
+                lo = bisect.bisect_left(lefts, area.left-self.max_w-2*self.gap)
+                hi = bisect.bisect_left(lefts, area.right)
+                if area.collidelist(rects[lo:hi]) != -1:
+                    continue
+                i = bisect.bisect_left(lefts, rect.left)
+                lefts.insert(i, rect.left)
+                rects.insert(i, rect)
+                layout.append((kind, rect))
+                return True
+            return False
+
+        x0 = max(left, WIDTH//2) if index == 0 else left  # 最初の画面の左半分（スタート地点）には置かない
+        if x0 < right:
+            vertical = rng.randint(0, 1) == 0
+            kind = "field" if rng.randint(0, 1) == 0 else "death"
+            def make_field():
+                if vertical:
+                    w, h = 50, rng.randint(200, 500) if kind == "field" else rng.randint(50, 100)
+                    cy = rng.randint(200, HEIGHT)
+                else:
+                    w, h = rng.randint(200, 500) if kind == "field" else rng.randint(50, 100), 50
+                    cy = rng.randint(200, HEIGHT-50)
+                rect = pg.Rect(0, 0, w, h)
+                rect.left = rng.randint(x0, max(x0, right-w))
+                rect.centery = cy
+                return rect
+            place(kind, make_field)
+        if right-left >= 30:  # ゴール手前の端数のチャンクがコインより狭ければコインは置かない
+            for _ in range(5):
+                place("coin", lambda: pg.Rect(0, 0, 30, 30).move(
+                    rng.randint(left, right-30), rng.randint(35, int(HEIGHT*0.8)-15)))
+        return layout
+
+    def layout(self, goal: int = GOAL) -> dict[int, list[tuple[str, pg.Rect]]]:
+        """
+        ゴールまでのすべてのチャンクの配置をまとめて決める
+        引数 goal：ワールドの右端
+        戻り値：チャンク番号から配置への辞書
+        """
+        return {i: self.chunk(i, goal) for i in range((goal+self.chunk_w-1)//self.chunk_w)}
+
+
+class ChunkPrefetcher:
+    """
+    チャンクの中身の準備（配置の決定とSurfaceの作成）を別スレッドで行い，
+    完成したものをキューでメインループに渡すクラス
+    """
+    def __init__(self, build):
+        """
+        引数 build：チャンク番号を受け取り，チャンクの中身を返す関数（別スレッドで呼ばれる）
+        """
+        self.build = build
+        self.requests: queue.Queue[int | None] = queue.Queue()  # 準備するチャンク番号
+        self.done: queue.Queue[tuple[int, Any]] = queue.Queue()  # 準備できた(チャンク番号, 中身)
+        self.thread = threading.Thread(target=self._run, name="ChunkPrefetcher", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        """
+        ワーカースレッドの処理：依頼されたチャンクを順に準備する（Noneで終了）
+        """
+        while True:
+            index = self.requests.get()
+            if index is None:
+                return
+            self.done.put((index, self.build(index)))
+
+    def request(self, index: int):
+        """
+        チャンクの準備を依頼する
+        引数 index：チャンク番号
+        """
+        self.requests.put(index)
+
+    def poll(self) -> list[tuple[int, Any]]:
+        """
+        準備できたチャンクを待たずに取り出す
+        戻り値：(チャンク番号, 中身)のリスト
+        """
+        ready = []
+        while True:
+            try:
+                ready.append(self.done.get_nowait())
+            except queue.Empty:
+                return ready
+
+    def close(self):
+        """
+        ワーカースレッドを終了する
+        """
+        self.requests.put(None)
+        self.thread.join()
+
+
+class LevelStreamer:
+    """
+    ワールドをx方向のチャンクに分け，画面に近づいたチャンクの中身（コイン，Field，Death_Field）だけを生成し，
+    カメラの後ろに過ぎたチャンクを解放するクラス
+    GOALがどれだけ遠くても，生きているスプライトの数と1フレームの処理量は一定になる
+    prefetchが1以上なら，必要になるprefetchチャンク先までをChunkPrefetcherで先に準備しておき，
+    フレームループではグループに入れるだけにする（間に合わなかったチャンクはその場で作る）
+    """
+    def __init__(self, camera: Camera, coins: pg.sprite.Group, fields: pg.sprite.Group,
+                 Death_Fields: pg.sprite.Group, generator: LevelGenerator, goal: int = GOAL,
+                 prefetch: int = 2):
+        """
+        引数1 camera：スクロールを管理するカメラ
+        引数2 coins：コインを入れるグループ
+        引数3 fields：Fieldを入れるグループ
+        引数4 Death_Fields：Death_Fieldを入れるグループ
+        引数5 generator：チャンクの配置を決めるジェネレータ
+        引数6 goal：生成するワールドの右端
+        引数7 prefetch：別スレッドで先に準備しておくチャンク数（0なら別スレッドを使わない）
+        """
+        self.camera = camera
+        self.generator = generator
+        self.coins = coins
+        self.fields = fields
+        self.Death_Fields = Death_Fields
+        self.goal = goal
+        self.chunk_w = generator.chunk_w
+        self.loaded: dict[int, tuple[int, list[pg.sprite.Sprite]]] = {}  # チャンク番号から(右端, スプライト)への辞書
+        self.next_chunk = 0  # 次に生成するチャンク番号
+        self.prefetch = prefetch
+        self.prefetcher = ChunkPrefetcher(self.generate) if prefetch > 0 else None
+        self.next_request = 0  # 次に準備を依頼するチャンク番号
+        self.ready: dict[int, list[tuple[pg.sprite.Group, pg.sprite.Sprite]]] = {}  # 準備できたチャンク
+
+    def generate(self, index: int) -> list[tuple[pg.sprite.Group, pg.sprite.Sprite]]:
+        """
+        チャンクの配置からスプライトを作る
+        引数 index：チャンク番号
+        戻り値：(入れるグループ, スプライト)のリスト
+        """
+        content = []
+        for kind, rect in self.generator.chunk(index, self.goal):
+            if kind == "coin":
+                content.append((self.coins, Coin(*rect.center)))
+            elif kind == "field":
+                content.append((self.fields, Field(rect.left, rect.centery, rect.width, rect.height)))
+            else:
+                content.append((self.Death_Fields, Field(rect.left, rect.centery, rect.width, rect.height, (255, 0, 0))))
+        return content
+
+    def load(self, index: int, content: list[tuple[pg.sprite.Group, pg.sprite.Sprite]]):
+        """
+        チャンクの中身をグループに入れる
+        引数1 index：チャンク番号
+        引数2 content：(入れるグループ, スプライト)のリスト
+        """
+        for group, spr in content:
+            group.add(spr)
+        sprites = [spr for _, spr in content]
+        right = max([spr.rect.right for spr in sprites], default=(index+1)*self.chunk_w)
+        self.loaded[index] = (right, sprites)
+
+    def update(self):
+        """
+        画面の1チャンク先までを生成し，右端がカメラより左に過ぎたチャンクを解放する
+        """
+        ahead = self.camera.x+WIDTH+self.chunk_w  # ここまでのチャンクを用意しておく
+        if self.prefetcher is not None:
+            for index, content in self.prefetcher.poll():
+                if index >= self.next_chunk:  # その場で作り済みのものは捨てる
+                    self.ready[index] = content
+            limit = ahead+self.prefetch*self.chunk_w
+            while self.next_request*self.chunk_w < min(limit, self.goal):
+                self.prefetcher.request(self.next_request)
+                self.next_request += 1
+        while self.next_chunk*self.chunk_w < min(ahead, self.goal):
+            content = self.ready.pop(self.next_chunk, None)
+            if content is None:  # 準備が間に合わなかった
+                content = self.generate(self.next_chunk)
+            self.load(self.next_chunk, content)
+            self.next_chunk += 1
+        for index, (right, sprites) in list(self.loaded.items()):
+            if right < self.camera.x:  # チャンクの中身がすべて画面の左に消えた
+                for spr in sprites:
+                    spr.kill()
+                del self.loaded[index]
+
+    def close(self):
+        """
+        先読みのワーカースレッドを終了する
+        """
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+            self.prefetcher = None
+
+
 class ExperienceBar(pg.sprite.Sprite):
     """
     経験値バー
@@ -452,8 +1856,12 @@ class ExperienceBar(pg.sprite.Sprite):
         self.rect = self.image.get_rect(topleft=(10, 10))
         self.current_exp = 0
         self.max_exp = 100
+        self.rendered = None  # imageに描画済みの(経験値, 最大経験値)
 
     def update(self):
+        if self.rendered == (self.current_exp, self.max_exp):  # 変化がなければ描画しない
+            return
+        self.rendered = (self.current_exp, self.max_exp)
         self.image.fill(BLACK)
         exp_percentage = min(self.current_exp / self.max_exp, 1.0)
         pg.draw.rect(self.image, BLUE, (0, 0, 100 * exp_percentage, 20))
@@ -467,11 +1875,15 @@ class Level(pg.sprite.Sprite):
         super().__init__()
         self.level = 1
         self.font = pg.font.Font(None, 36)
-        self.image = self.font.render(f"Level: {self.level}", True, BLACK)
+        self.atlas = GlyphAtlas(self.font, BLACK, True, "Level: ")
+        self.image = self.atlas.render(str(self.level))
+        self.rendered = self.level  # imageに描画済みのレベル
         self.rect = self.image.get_rect(topleft=(120, 10))
 
     def update(self):
-        self.image = self.font.render(f"Level: {self.level}", True, BLACK)
+        if self.level != self.rendered:  # レベルが変わったときだけ描画し直す
+            self.image = self.atlas.render(str(self.level))
+            self.rendered = self.level
 
 
 class Skill(pg.sprite.Sprite):
@@ -493,22 +1905,18 @@ class Skill(pg.sprite.Sprite):
         self.show_star_timer1 = 50
         self.show_star_timer2 = 100
         self.show_star_timer3 = 100
+        self.rendered = None  # imageに描画済みのアイコンの状態
 
     def update(self):
-        self.image.fill((0, 0, 0, 0))  # Make the background transparent
+        icons = []  # 各スキルアイコンの状態（"lock"：未解放，"ready"：使用可，"on"：発動中）
         if self.level >= 1:
-            pg.draw.circle(self.image, GREEN, (25, 25), 20)
-            pg.draw.line(self.image, RED, (12, 12), (37, 37), 5)
-            pg.draw.circle(self.image, GREEN, (75, 25), 20)
-            pg.draw.line(self.image, RED, (62, 12), (87, 37), 5)
-            pg.draw.circle(self.image, GREEN, (125, 25), 20)
-            pg.draw.line(self.image, RED, (112, 12), (137, 37), 5)
+            icons = ["lock", "lock", "lock"]
 
         if self.level >= 2:
-            pg.draw.circle(self.image, GREEN, (25, 25), 20)
+            icons[0] = "ready"
             if self.skill1:
                 self.switch1 = True
-                pg.draw.circle(self.image, YELLOW, (25, 25), 20)
+                icons[0] = "on"
                 self.show_star_timer1 -= 1
             if self.show_star_timer1 <= 0:
                 self.switch1 = False
@@ -516,10 +1924,10 @@ class Skill(pg.sprite.Sprite):
                 self.show_star_timer1 = 50
 
         if self.level >= 3:
-            pg.draw.circle(self.image, GREEN, (75, 25), 20)
+            icons[1] = "ready"
             if self.skill2:
                 self.switch2 = True
-                pg.draw.circle(self.image, YELLOW, (75, 25), 20)
+                icons[1] = "on"
                 self.show_star_timer2 -= 1
             if self.show_star_timer2 <= 0:
                 self.switch2 = False
@@ -527,16 +1935,26 @@ class Skill(pg.sprite.Sprite):
                 self.show_star_timer2 = 100
 
         if self.level >= 4:
-            pg.draw.circle(self.image, GREEN, (125, 25), 20)
+            icons[2] = "ready"
             if self.skill3:
                 self.switch3 = True
-                pg.draw.circle(self.image, YELLOW, (125, 25), 20)
+                icons[2] = "on"
                 self.show_star_timer3 -= 1
             if self.show_star_timer3 <= 0:
                 self.switch3 = False
                 self.skill3 = False
                 self.show_star_timer3 = 100
 
+        if icons == self.rendered:  # アイコンの状態が変わったときだけ描画し直す
+            return
+        self.rendered = icons
+        self.image.fill((0, 0, 0, 0))  # Make the background transparent
+        for i, icon in enumerate(icons):
+            x = 25+50*i
+            pg.draw.circle(self.image, YELLOW if icon == "on" else GREEN, (x, 25), 20)
+            if icon == "lock":
+                pg.draw.line(self.image, RED, (x-13, 12), (x+12, 37), 5)
+
 
 class Skill1(pg.sprite.Sprite):
     """
@@ -545,8 +1963,8 @@ class Skill1(pg.sprite.Sprite):
     def __init__(self):
         super().__init__()
         # Load image and resize
-        self.image_path = "ex05/fig/a.jpg"
-        self.original_image = pg.image.load(self.image_path)
+        self.image_path = fig_path("a.jpg", "alien3.png")  # スキル画像がなければエイリアンで代用
+        self.original_image = Assets.get(self.image_path)
         self.skill1_image = pg.transform.scale(self.original_image, (100, 100))
         self.skill1_rect = self.skill1_image.get_rect()
 
@@ -571,19 +1989,25 @@ class Hp_bar(pg.sprite.Sprite):
     """
     HP
     """
+    full_hp = 900  # HPの初期値と上限（バランス調整用）
+
     def __init__(self):
         super().__init__()
 
-        self.max_hp = 900
+        self.max_hp = __class__.full_hp
         self.current_hp = self.max_hp
         self.image = pg.Surface((self.max_hp, 20))
         self.rect = self.image.get_rect(topleft=(250, 10))
+        self.rendered = None  # imageに描画済みのHP
         #self.image = pg.Surface((10, 20))
         #self.rect = self.image.get_rect(topright=(1150, 10))
 
     def update(self):
-        if self.max_hp > 900:
-            self.max_hp = self.max_hp - (self.max_hp - 900)
+        if self.max_hp > __class__.full_hp:
+            self.max_hp = self.max_hp - (self.max_hp - __class__.full_hp)
+        if self.max_hp == self.rendered:  # HPが変わったときだけSurfaceを作り直す
+            return
+        self.rendered = self.max_hp
         self.image = pg.Surface((self.max_hp, 20))
         self.rect = self.image.get_rect(topleft=(250, 10))
         self.image.fill(GREEN)
@@ -593,60 +2017,425 @@ class Hp_bar(pg.sprite.Sprite):
 
 
 
-def main():
-    global MV_FIELD,MV_MOVE
-    pg.display.set_caption("真！こうかとん無双")
-    screen = pg.display.set_mode((WIDTH, HEIGHT))
-    bg_img = pg.image.load(f"{MAIN_DIR}/fig/pg_bg.jpg")
-    score = Score()
-    bird = Bird(3, (250, 60))
-    bombs = pg.sprite.Group()
-    funns = pg.sprite.Group()
-    beams = pg.sprite.Group()
-    exps = pg.sprite.Group()
-    emys = pg.sprite.Group()
-    ghosts = pg.sprite.Group()
-    fields = pg.sprite.Group()
-    Death_Fields = pg.sprite.Group()
-
-    Goal = pg.sprite.Group()
-    Goal.add(Field(2500,0,20,HEIGHT))
-    coins = pg.sprite.Group()
-    for i in range(5):
-        coins.add(Coin(random.randint(30, WIDTH), random.randint(50, HEIGHT*0.8)))  #コインの表示
-        coins.add(Coin(random.randint(WIDTH, WIDTH*2), random.randint(50, HEIGHT*0.8)))  #スライドさせたときにも表示される
-        coins.add(Coin(random.randint(WIDTH*2, WIDTH*3), random.randint(50, HEIGHT*0.8)))
-        coins.add(Coin(random.randint(WIDTH*3, GOAL), random.randint(50, HEIGHT*0.8)))
-    skill1_group = pg.sprite.Group()
-
-    exp_bar = ExperienceBar()
-    level_display = Level()
-    skill = Skill(exp_bar, level_display.level)
-    hp_bar =Hp_bar()
-    all_sprites = pg.sprite.Group(exp_bar, level_display,skill,hp_bar)
-    #skill1 = pg.sprite.Group()
-    tmr = 0
+class FrameProfiler:
+    """
+    1フレーム内の処理ごとの時間を計測するクラス
+    直近の平均を画面に重ねて表示（F3で切り替え）し，フレームごとの時間をCSVに書き出せる
+    """
+    # 計測する処理名（CSVの列．そのフレームで行わなかった処理は0になる）
+    phases = ("input", "events", "spawn", "collision", "bird.update",
+              "beams.update", "ghosts.update", "bombs.update", "exps.update", "Goal.update", "emys.update",
+              "funns.update", "fields.update", "Death_Fields.update", "coins.update", "skill1.update", "hud.update",
+              "shots.update", "background", "queue", *(f"blits.{layer}" for layer in Renderer.layers),
+              "profiler.draw", "display.update", "capture", "frame")
+
+    def __init__(self, overlay: bool = False, csv_path: str | None = None, window: int = 50):
+        """
+        引数1 overlay：計測結果を画面に重ねて表示するか
+        引数2 csv_path：フレームごとの時間（ミリ秒）を書き出すCSVファイル（Noneなら書き出さない）
+        引数3 window：平均をとるフレーム数
+        """
+        self.overlay = overlay
+        self.csv_file = open(csv_path, "w", newline="") if csv_path is not None else None
+        self.csv_writer = None
+        if self.csv_file is not None:
+            self.csv_writer = csv.DictWriter(self.csv_file, ["tmr", *__class__.phases], restval="0.000")
+            self.csv_writer.writeheader()
+        self.enabled = overlay or self.csv_file is not None  # 計測するか
+        self.history: deque[dict[str, float]] = deque(maxlen=window)
+        self.frame: dict[str, float] = {}  # 今フレームの処理ごとの時間（秒）
+        self.start = 0.0
+        self.last = 0.0
+        self.font = None
+        self.image = None  # 重ねて表示する計測結果のSurface
+        self.frames = 0
+
+    def toggle(self):
+        """
+        画面への表示を切り替える（計測のオンオフはフレームの途中ではなく次のstart_frameで反映する）
+        """
+        self.overlay = not self.overlay
 
-    clock = pg.time.Clock()
-    emys.add(Enemy(100000))
-    while True:
-        key_lst = pg.key.get_pressed()
-        screen.blit(bg_img, [0, 0])
-        for event in pg.event.get():
+    def start_frame(self):
+        """
+        フレームの計測を始める
+        """
+        self.enabled = self.overlay or self.csv_file is not None
+        if self.enabled:
+            self.frame = {}
+            self.start = self.last = time.perf_counter()
+
+    def lap(self, name: str):
+        """
+        前回のlapからの時間を処理nameの時間として記録する
+        引数 name：処理の名前
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.frame[name] = self.frame.get(name, 0.0)+now-self.last
+        self.last = now
+
+    def end_frame(self, tmr: int):
+        """
+        フレームの計測を終え，履歴とCSVに記録する
+        引数 tmr：フレーム番号
+        """
+        if not self.enabled:
+            return
+        self.frame["frame"] = time.perf_counter()-self.start
+        self.history.append(self.frame)
+        self.frames += 1
+        if self.csv_file is not None:
+            self.csv_writer.writerow({"tmr": tmr, **{k: f"{v*1000:.3f}" for k, v in self.frame.items()}})
+
+
+    def averages(self) -> dict[str, float]:
+        """
+        直近windowフレームの処理ごとの平均時間を返す
+        戻り値：処理名から平均時間（ミリ秒）への辞書（時間の長い順）
+        """
+        total: dict[str, float] = {}
+        for frame in self.history:
+            for name, t in frame.items():
+                total[name] = total.get(name, 0.0)+t
+        n = max(len(self.history), 1)
+        return dict(sorted(((k, v*1000/n) for k, v in total.items()), key=lambda kv: -kv[1]))
+
+    def draw(self, screen: pg.Surface) -> pg.Rect | None:
+        """
+        計測結果を画面右上に重ねて表示する（10フレームごとに描画し直す）
+        引数 screen：画面Surface
+        戻り値：描いた領域（表示しない場合はNone）
+        """
+        if not self.overlay:
+            return None
+        if self.image is None or self.frames % 10 == 0:
+            if self.font is None:
+                self.font = pg.font.Font(None, 20)
+            lines = list(self.averages().items())[:16]  # 時間の長い順に16件
+            self.image = pg.Surface((220, 16*len(lines)+8), pg.SRCALPHA)
+            self.image.fill((0, 0, 0, 160))
+            for i, (name, ms) in enumerate(lines):
+                self.image.blit(self.font.render(name, True, WHITE), (6, 4+16*i))
+                value = self.font.render(f"{ms:.2f} ms", True, WHITE)
+                self.image.blit(value, value.get_rect(topright=(214, 4+16*i)))
+        return screen.blit(self.image, self.image.get_rect(topright=(WIDTH-10, 40)))
+
+    def close(self):
+        """
+        CSVファイルを閉じる
+        """
+        if self.csv_file is not None:
+            self.csv_file.close()
+            self.csv_file = None
+            self.enabled = self.overlay
+
+
+@dataclass
+class SimResult:
+    """
+    1回のプレイの結果
+    """
+    score: int  # 最終スコア
+    level: int  # 最終レベル
+    frames: int  # 生存したフレーム数
+    cause: str  # 終了理由（"goal", "bomb", "funn", "death_field", "out", "hp", "quit", "timeout"）
+
+
+class KeyState:
+    """
+    pg.key.get_pressed()の代わりに，押下キーの集合から真理値を返すクラス
+    """
+    def __init__(self, keys=()):
+        """
+        引数 keys：押下中のキーの集合
+        """
+        self.keys = frozenset(keys)
+
+    def __getitem__(self, key: int) -> bool:
+        return key in self.keys
+
+
+class LiveInput:
+    """
+    キーボードとウィンドウのイベントをそのまま返す入力
+    """
+    def poll(self, tmr: int) -> tuple[Any, list[pg.event.Event]]:
+        """
+        引数 tmr：現在のフレーム番号
+        戻り値：押下キーの真理値リストとイベントのリスト
+        """
+        return pg.key.get_pressed(), pg.event.get()
+
+
+class ScriptedInput:
+    """
+    あらかじめ決めた押下キーとキー入力イベントを順に返す入力
+    """
+    def __init__(self, frames: list[set[int]], keydowns: dict[int, list[int]] | None = None):
+        """
+        引数1 frames：フレームごとの押下キーの集合のリスト（尽きたら何も押さない）
+        引数2 keydowns：フレーム番号からそのフレームで押したキーのリストへの辞書
+        """
+        self.frames = frames
+        self.keydowns = keydowns or {}
+
+    def poll(self, tmr: int) -> tuple[KeyState, list[pg.event.Event]]:
+        keys = self.frames[tmr] if tmr < len(self.frames) else ()
+        events = [pg.event.Event(pg.KEYDOWN, key=k) for k in self.keydowns.get(tmr, ())]
+        return KeyState(keys), events
+
+
+class RandomInput:
+    """
+    乱数で押下キーとスキルキーの入力を作る入力（負荷試験・バランス調整用）
+    birdを渡すと，画面の上端近くでは上キーを押さず，下端近くでは上キーを押しやすくして画面外に出にくくする
+    """
+    ceiling = 150  # こうかとんの上端がこれより上なら上キーを押さない
+    floor = HEIGHT-250  # こうかとんの下端がこれより下ならrescueの確率で上キーを押す
+    rescue = 0.9  # 下端近くで上キーを押す確率
+
+    def __init__(self, seed: int | None = None, right: float = 0.8, up: float = 0.2, skill: float = 0.01,
+                 bird: "Bird | None" = None):
+        """
+        引数1 seed：乱数の種
+        引数2 right：右キーを押す確率
+        引数3 up：上キーを押す確率
+        引数4 skill：スキルキー（1～3）を押す確率
+        引数5 bird：位置を見て上キーの確率を変えるこうかとん（Noneなら常にupの確率）
+        """
+        self.rng = random.Random(seed)
+        self.right = right
+        self.up = up
+        self.skill = skill
+        self.bird = bird
+
+    def poll(self, tmr: int) -> tuple[KeyState, list[pg.event.Event]]:
+        keys = set()
+        if self.rng.random() < self.right:
+            keys.add(pg.K_RIGHT)
+        up = self.up
+        if self.bird is not None:
+            if self.bird.rect.top < __class__.ceiling:
+                up = 0.0
+            elif self.bird.rect.bottom > __class__.floor:
+                up = __class__.rescue
+        if self.rng.random() < up:
+            keys.add(pg.K_UP)
+        events = []
+        if self.rng.random() < self.skill:
+            events.append(pg.event.Event(pg.KEYDOWN, key=self.rng.choice([pg.K_1, pg.K_2, pg.K_3])))
+        return KeyState(keys), events
+
+
+class InputRecorder:
+    """
+    別の入力をそのまま返しながら，フレームごとの入力を1バイトのビットマスクでファイルに記録する入力
+    ファイルは先頭に識別子と乱数の種，その後に1フレーム1バイトが続く（ReplayInputで再生する）
+    """
+    magic = b"KKTN"  # ファイルの識別子
+    header = struct.Struct("<4sq")  # 識別子，乱数の種
+    keys = (pg.K_UP, pg.K_DOWN, pg.K_LEFT, pg.K_RIGHT)  # 押下中のキー（ビット0～3）
+    keydowns = (pg.K_1, pg.K_2, pg.K_3)  # そのフレームで押したスキルキー（ビット4～6）
+    quit_bit = 1 << 7  # 終了イベント（ビット7）
+
+    def __init__(self, inputs, path: str, seed: int):
+        """
+        引数1 inputs：記録する入力（poll(tmr)で(押下キー, イベント)を返すもの）
+        引数2 path：記録するファイルのパス
+        引数3 seed：このプレイの乱数の種
+        """
+        self.inputs = inputs
+        self.file = open(path, "wb")
+        self.file.write(__class__.header.pack(__class__.magic, seed))
+
+    @classmethod
+    def encode(cls, keys, events: list[pg.event.Event]) -> int:
+        """
+        押下キーとイベントをビットマスクにする（ゲームのロジックに影響しない入力は捨てる）
+        引数1 keys：押下キーの真理値リスト
+        引数2 events：イベントのリスト
+        戻り値：1バイトのビットマスク
+        """
+        mask = 0
+        for bit, key in enumerate(cls.keys):
+            if keys[key]:
+                mask |= 1 << bit
+        for event in events:
             if event.type == pg.QUIT:
-                return 0
-            if exp_bar.current_exp >= exp_bar.max_exp:
-                exp_bar.current_exp = 0
-                level_display.level += 1
-                score.value += 100
-                skill.level = level_display.level
+                mask |= cls.quit_bit
+            elif event.type == pg.KEYDOWN and event.key in cls.keydowns:
+                mask |= 1 << (len(cls.keys)+cls.keydowns.index(event.key))
+        return mask
+
+    @classmethod
+    def decode(cls, mask: int) -> tuple[KeyState, list[pg.event.Event]]:
+        """
+        ビットマスクを押下キーとイベントに戻す
+        引数 mask：encodeで作ったビットマスク
+        戻り値：押下キーとイベントのリスト
+        """
+        keys = [key for bit, key in enumerate(cls.keys) if mask & (1 << bit)]
+        events = [pg.event.Event(pg.KEYDOWN, key=key) for i, key in enumerate(cls.keydowns)
+                  if mask & (1 << (len(cls.keys)+i))]
+        if mask & cls.quit_bit:
+            events.append(pg.event.Event(pg.QUIT))
+        return KeyState(keys), events
+
+    def poll(self, tmr: int) -> tuple[Any, list[pg.event.Event]]:
+        keys, events = self.inputs.poll(tmr)
+        self.file.write(bytes([__class__.encode(keys, events)]))
+        return keys, events
+
+    def close(self):
+        """
+        記録ファイルを閉じる
+        """
+        self.file.close()
+
+
+class ReplayInput:
+    """
+    InputRecorderで記録したファイルから，フレームごとの入力を順に返す入力
+    """
+    def __init__(self, path: str):
+        """
+        引数 path：記録ファイルのパス
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+        header = InputRecorder.header
+        magic, self.seed = header.unpack_from(data)
+        if magic != InputRecorder.magic:
+            raise ValueError(f"{path}は入力の記録ファイルではありません")
+        self.masks = data[header.size:]  # 1フレーム1バイトのビットマスク
+
+    def __len__(self) -> int:
+        return len(self.masks)
+
+    def poll(self, tmr: int) -> tuple[KeyState, list[pg.event.Event]]:
+        if tmr >= len(self.masks):  # 記録が尽きたら終了する
+            return KeyState(), [pg.event.Event(pg.QUIT)]
+        return InputRecorder.decode(self.masks[tmr])
+
+
+class Game:
+    """
+    1回のプレイの状態を持ち，1フレーム分の処理（update）と描画（draw）を行うクラス
+    """
+    def __init__(self, screen: pg.Surface, dirty: bool = False, profiler: FrameProfiler | None = None,
+                 vector: bool = False, seed: int | None = None, prefetch: int = 2):
+        """
+        引数1 screen：画面Surface
+        引数2 dirty：変化した領域だけを画面更新するか
+        引数3 profiler：処理時間の計測（Noneなら計測しない）
+        引数4 vector：爆弾とカラスの糞をProjectileArray（NumPy）で処理するか
+        引数5 seed：このゲームの乱数の種（Noneなら毎回異なる）
+        引数6 prefetch：別スレッドで先に準備しておくチャンク数（描画しない実行では0にしてスレッドを作らない）
+        """
+        self.screen = screen
+        self.rng = random.Random(seed)  # ゲームごとの乱数（同じ種なら同じ展開になる）
+        self.profiler = profiler if profiler is not None else FrameProfiler()
+        Assets.convert_all()  # 画面生成前に読み込んだ画像を表示形式にする
+        bg_img = Assets.get(f"{MAIN_DIR}/fig/pg_bg.jpg", alpha=False)
+        self.camera = Camera()
+        self.renderer = Renderer(screen, bg_img, self.camera, dirty)
+        Funn.prerender()
+        self.grid = SpatialHash(self.camera)
+        self.bomb_pool = SpritePool(Bomb)
+        self.funn_pool = SpritePool(Funn)
+        self.beam_pool = SpritePool(Beam)
+        self.exp_pool = SpritePool(Explosion)
+        self.score = Score()
+        self.bird = Bird(3, (250, 60))
+        self.bombs = pg.sprite.Group()
+        self.funns = pg.sprite.Group()
+        self.shots = ProjectileArray() if vector else None  # vectorのときはbombs, funnsの代わりに使う
+        self.beams = pg.sprite.Group()
+        self.exps = pg.sprite.Group()
+        self.emys = pg.sprite.Group()
+        self.ghosts = pg.sprite.Group()
+        self.fields = pg.sprite.Group()
+        self.Death_Fields = pg.sprite.Group()
+
+        self.Goal = pg.sprite.Group()
+        self.Goal.add(Field(2500,0,20,HEIGHT))
+        self.coins = pg.sprite.Group()
+        # コインとFieldはカメラの進みに合わせてチャンクごとに生成する
+        self.streamer = LevelStreamer(self.camera, self.coins, self.fields, self.Death_Fields,
+                                      LevelGenerator(self.rng.getrandbits(32)), prefetch=prefetch)
+        self.skill1_group = pg.sprite.Group()
+
+        self.exp_bar = ExperienceBar()
+        self.level_display = Level()
+        self.skill = Skill(self.exp_bar, self.level_display.level)
+        self.hp_bar = Hp_bar()
+        self.all_sprites = pg.sprite.Group(self.exp_bar, self.level_display, self.skill, self.hp_bar)
+        self.tmr = 0
+        self.emys.add(Enemy(100000, self.rng))
+        # 描画に使う画像がすべて表示形式になっているかを確かめる
+        Assets.check({"Coin": Coin.get_img(), **{f"Funn{key}": img for key, img in Funn.imgs.items()}})
+
+    def close(self):
+        """
+        ゲームが使っているワーカースレッドなどを終了する
+        """
+        self.streamer.close()
+
+    def result(self, cause: str) -> SimResult:
+        """
+        現在の状態からプレイ結果を作る
+        引数 cause：終了理由
+        戻り値：プレイ結果
+        """
+        return SimResult(self.score.value, self.level_display.level, self.tmr, cause)
+
+    def update(self, key_lst, events: list[pg.event.Event]) -> str | None:
+        """
+        1フレーム分ゲームを進める（描画はしない）
+        引数1 key_lst：押下キーの真理値リスト
+        引数2 events：このフレームのイベントのリスト
+        戻り値：ゲームが終わった場合は終了理由，続く場合はNone
+        """
+        lap = self.profiler.lap
+        cause = self.handle_events(events)
+        lap("events")
+        if cause is not None:
+            return cause
+        self.spawn()
+        lap("spawn")
+        cause = self.collide()
+        lap("collision")
+        if cause is not None:
+            return cause
+        self.move(key_lst)
+        return None
+
+    def handle_events(self, events: list[pg.event.Event]) -> str | None:
+        """
+        レベルアップとキー入力イベントを処理する
+        引数 events：このフレームのイベントのリスト
+        戻り値：終了イベントがあれば"quit"，なければNone
+        """
+        bird, exp_bar, level_display, skill, hp_bar, score = self.bird, self.exp_bar, self.level_display, self.skill, self.hp_bar, self.score
+
+        if exp_bar.current_exp >= exp_bar.max_exp:  # 経験値がたまったらレベルアップ
+            exp_bar.current_exp = 0
+            level_display.level += 1
+            score.value += 100
+            skill.level = level_display.level
+
+        for event in events:
+            if event.type == pg.QUIT:
+                return "quit"
 
             elif event.type == pg.KEYDOWN:
                 if event.key == pg.K_1:
                     if skill.level >= 2:
                         if skill.switch1 != True:
                             skill1 = Skill1()
-                            skill1_group.add(skill1)
+                            self.skill1_group.add(skill1)
                             skill.skill1 = True
                             hp_bar.max_hp -= 50
 
@@ -659,176 +2448,349 @@ def main():
                 elif event.key == pg.K_3:
                     if skill.level >= 4:
                         if skill.switch3 != True:
-                            beams.add(Beam(bird))
+                            self.beams.add(self.beam_pool.acquire(bird))
                             skill.skill3 = True
 
+                elif event.key == pg.K_F3:  # 処理時間の表示を切り替え
+                    self.profiler.toggle()
+
             #if event.type == pg.KEYDOWN and event.key == pg.K_SPACE:
             #beams.add(Beam(bird))
+        return None
+
+    def spawn(self):
+        """
+        敵機，コイン，Field，爆弾を出現させる
+        """
+        bird, camera, tmr = self.bird, self.camera, self.tmr
+        bombs, funns, emys, ghosts = self.bombs, self.funns, self.emys, self.ghosts
 
         if tmr%200 == 0:  # 200フレームに1回，敵機を出現させる
-            ghosts.add(Ghost(tmr))
-
-        screen.blit(bg_img, [0, 0])        
-
-        if tmr % 500 == 0: #5秒に1回Fieldを出す
-            random_field = random.randint(0, 1)
-            random_field2 = random.randint(0, 1)
-            if random_field == 0:
-                if random_field2== 0:
-                    fields.add(Field(random.randint(WIDTH / 2, WIDTH),  #縦長のFieldを作成
-                                    random.randint(200, HEIGHT),
-                                    50,
-                                    random.randint(200, 500)))
-                else:
-                    Death_Fields.add(Field(random.randint(WIDTH / 2, WIDTH),  #縦長のDeath_Fieldを作成
-                                    random.randint(200, HEIGHT),
-                                    50,
-                                    random.randint(50, 100),
-                                    (255,0,0)))
-            else:
-                if random_field2== 0:
-                    fields.add(Field(random.randint(WIDTH / 2, WIDTH),   #横長のFieldを作成
-                                    random.randint(200, HEIGHT - 50),
-                                    random.randint(200, 500),
-                                    50,))
-                else:
-                    Death_Fields.add(Field(random.randint(WIDTH / 2, WIDTH),   #横長のDeath_Fieldを作成
-                                    random.randint(200, HEIGHT - 50),
-                                    random.randint(50, 100),
-                                    50,
-                                    (255, 0, 0)))
+            ghosts.add(Ghost(tmr, self.rng))
 
+        self.streamer.update()  # 画面に近づいたチャンクのコインとFieldを出す
 
         for ghost in ghosts:
              if ghost.state == "stop" and tmr%ghost.interval == 0:
         # #         # 敵機が停止状態に入ったら，intervalに応じて爆弾投下
-                 bombs.add(Bomb(ghost, bird))
+                 if self.shots is not None:
+                     self.shots.fire("bomb", Assets.get(f"{MAIN_DIR}/fig/fire.png", 0.1), ghost.rect, bird.rect, camera,
+                                     Bomb.speed)
+                 else:
+                     bombs.add(self.bomb_pool.acquire(ghost, bird, camera))
+
+        for emy in emys:
+            if emy.state == "stop" and tmr%emy.interval == 0:
+                # 敵機が停止状態に入ったら，intervalに応じて爆弾投下
+                if self.shots is not None:
+                    rad = self.rng.randint(10, 50)  # Funnと同じ順番で乱数を使う
+                    img = Funn.get_img(rad, self.rng.choice(Funn.colors))
+                    self.shots.fire("funn", img, emy.rect, bird.rect, camera, Funn.speed)
+                else:
+                    funns.add(self.funn_pool.acquire(emy, bird, camera, self.rng))
+
+    def collide(self) -> str | None:
+        """
+        衝突判定を行い，スコア・経験値・爆発エフェクトに反映する
+        戻り値：こうかとんがやられたかゴールした場合は終了理由，それ以外はNone
+        """
+        bird, camera, grid = self.bird, self.camera, self.grid
+        exp_bar, hp_bar, score = self.exp_bar, self.hp_bar, self.score
+        beams, exps, emys, ghosts = self.beams, self.exps, self.emys, self.ghosts
+        fields, Death_Fields, Goal, coins = self.fields, self.Death_Fields, self.Goal, self.coins
 
-        for ghost in pg.sprite.groupcollide(ghosts, beams, True, True).keys():
-            exps.add(Explosion(ghost, 100))  # 爆発エフェクト
+        grid.clear()  # 衝突判定用のグリッドを作り直す
+
+        for ghost in grid.groupcollide(ghosts, beams, True, True).keys():
+            exps.add(self.exp_pool.acquire(ghost, 100, camera))  # 爆発エフェクト
             score.value += 10  # 10点アップ
-            bird.change_img(6, screen)  # こうかとん喜びエフェクト
-             
-        if pg.sprite.spritecollide(bird, coins, True): 
+            bird.change_img(6)  # こうかとん喜びエフェクト
+
+        if grid.spritecollide(bird, coins, True):
              exp_bar.current_exp += 100
-             score.value += 100     
+             score.value += 100
 
-        if len(pg.sprite.spritecollide(bird, ghosts, True)) != 0:
+        if len(grid.spritecollide(bird, ghosts, True)) != 0:
             exp_bar.current_exp += 100
-            #pg.display.update()
-            #time.sleep(2)
 
-        if pg.sprite.spritecollide(bird, Death_Fields, True): # 即死オブジェクト判定
-            bird.change_img(8, screen) # こうかとん悲しみエフェクト
-            score.update(screen)
-            pg.display.update()
-            time.sleep(2)
-            return
+        if grid.spritecollide(bird, Death_Fields, True): # 即死オブジェクト判定
+            bird.change_img(8) # こうかとん悲しみエフェクト
+            return "death_field"
 
-        for bomb in pg.sprite.groupcollide(bombs, beams, True, True).keys():
-            exps.add(Explosion(bomb, 50))  # 爆発エフェクト
+        for bomb in self.shoot_down("bomb"):
+            exps.add(self.exp_pool.acquire(bomb, 50, camera))  # 爆発エフェクト
             score.value += 1  # 1点アップ
 
-        for ghost in pg.sprite.groupcollide(ghosts, skill1_group, True, False).keys():
+        for ghost in grid.groupcollide(ghosts, self.skill1_group, True, False).keys():
             exp_bar.current_exp += 30
             score.value += 1  # 1点アップ
 
-        if len(pg.sprite.spritecollide(bird, bombs, True)) != 0:
-            bird.change_img(8, screen) # こうかとん悲しみエフェクト
-            score.update(screen)
-            pg.display.update()
-            time.sleep(2)
-            return
+        if self.hit_bird("bomb"):
+            bird.change_img(8) # こうかとん悲しみエフェクト
+            return "bomb"
 
-        for emy in emys:
-            if emy.state == "stop" and tmr%emy.interval == 0:
-                # 敵機が停止状態に入ったら，intervalに応じて爆弾投下
-                funns.add(Funn(emy, bird))
-
-        for emy in pg.sprite.groupcollide(emys, beams, True, True).keys():
-            exps.add(Explosion(emy, 100))  # 爆発エフェクト
+        for emy in grid.groupcollide(emys, beams, True, True).keys():
+            exps.add(self.exp_pool.acquire(emy, 100, camera))  # 爆発エフェクト
             score.value += 10  # 10点アップ
-            bird.change_img(6, screen)  # こうかとん喜びエフェクト
+            bird.change_img(6)  # こうかとん喜びエフェクト
 
-        for funn in pg.sprite.groupcollide(funns, beams, True, True).keys():
-            exps.add(Explosion(funn, 50))  # 爆発エフェクト
+        for funn in self.shoot_down("funn"):
+            exps.add(self.exp_pool.acquire(funn, 50, camera))  # 爆発エフェクト
             score.value += 1  # 1点アップ
 
-        if len(pg.sprite.spritecollide(bird, funns, True)) != 0:
-            print("爆発死")
-            bird.change_img(8, screen) # こうかとん悲しみエフェクト
-            score.update(screen)
-            pg.display.update()
-            time.sleep(2)
-            return
+        if self.hit_bird("funn"):
+            bird.change_img(8) # こうかとん悲しみエフェクト
+            return "funn"
 
-        if pg.sprite.spritecollide(bird,fields,False):
-            cc = pg.sprite.spritecollideany(bird,fields)
-            #print(cc.rect.center)
-            if cc.rect.centery + cc.rect.height*0.4 <= bird.rect.top <= cc.rect.bottom:#フィールドオブジェクトの上面判定
+        cc = grid.spritecollideany(bird, fields)
+        if cc is not None:
+            cc_rect = camera.apply(cc.rect)  # 画面座標で判定する
+            #print(cc_rect.center)
+            if cc_rect.centery + cc_rect.height*0.4 <= bird.rect.top <= cc_rect.bottom:#フィールドオブジェクトの上面判定
                 bird.rect.move_ip(0,10)
-            elif cc.rect.top <= bird.rect.bottom <= cc.rect.centery+20:#フィールドオブジェクトの下面判定
+            elif cc_rect.top <= bird.rect.bottom <= cc_rect.centery+20:#フィールドオブジェクトの下面判定
                 bird.rect.move_ip(0,-12)
             bird.rect.move_ip(0,-2)
-            MV_MOVE = True
+            bird.mv_move = True
 
 
         if bird.rect.top < 1 or HEIGHT -1 < bird.rect.bottom: # 上下画面外判定
-            bird.change_img(8, screen) # こうかとん悲しみエフェクト
-            score.update(screen)
-            pg.display.update()
-            time.sleep(2)
-            return
-        
-        if len(pg.sprite.spritecollide(bird,Goal,False)) != 0:
-            bird.change_img(6, screen) # こうかとん嬉しいエフェクト
-            score.update(screen)
-            pg.display.update()
-            time.sleep(2)
-            return
+            bird.change_img(8) # こうかとん悲しみエフェクト
+            return "out"
+
+        if len(grid.spritecollide(bird, Goal, False)) != 0:
+            bird.change_img(6) # こうかとん嬉しいエフェクト
+            return "goal"
 
         if hp_bar.max_hp <= 0:
-            bird.change_img(8, screen) # こうかとん悲しみエフェクト
-            score.update(screen)
-            pg.display.update()
-            time.sleep(2)
-            return
+            bird.change_img(8) # こうかとん悲しみエフェクト
+            return "hp"
+        return None
 
-        bird.update(key_lst, screen)
-        beams.update()
-        beams.draw(screen)
-        ghosts.update(tmr)
-        ghosts.draw(screen)
-        bombs.update()
-        bombs.draw(screen)
-        exps.update()
-        exps.draw(screen)
-        Goal.update()
-        Goal.draw(screen)
-        emys.update()
-        emys.draw(screen)
-        funns.update()
-        funns.draw(screen)
-        fields.update()
-        fields.draw(screen)
-        Death_Fields.update()
-        Death_Fields.draw(screen)
-        coins.update()
-        coins.draw(screen)
-        score.update(screen)
-        skill1_group.update()
-        skill1_group.draw(screen)
-        all_sprites.draw(screen)
-        all_sprites.update()
-        pg.display.update()
-        MV_FIELD = False
-        MV_MOVE = False
-        tmr += 1
-        clock.tick(50)
+    def shoot_down(self, kind: str) -> list:
+        """
+        ビームに当たった爆弾（またはカラスの糞）とビームを消す
+        引数 kind："bomb"または"funn"
+        戻り値：消えた弾（スプライト，ProjectileArrayなら画面座標のRect）のリスト
+        """
+        if self.shots is not None:
+            return self.shots.groupcollide(kind, self.beams, self.camera)
+        group = self.bombs if kind == "bomb" else self.funns
+        return list(self.grid.groupcollide(group, self.beams, True, True).keys())
 
+    def hit_bird(self, kind: str) -> bool:
+        """
+        こうかとんに当たった爆弾（またはカラスの糞）を消す
+        引数 kind："bomb"または"funn"
+        戻り値：1つでも当たったか
+        """
+        if self.shots is not None:
+            return self.shots.spritecollide(kind, self.bird.rect, self.camera) != 0
+        group = self.bombs if kind == "bomb" else self.funns
+        return len(self.grid.spritecollide(self.bird, group, True)) != 0
 
-if __name__ == "__main__":
+    def move(self, key_lst):
+        """
+        こうかとんとカメラ，各グループを1フレーム分動かす
+        引数 key_lst：押下キーの真理値リスト
+        """
+        camera, lap = self.camera, self.profiler.lap
+        self.bird.update(key_lst)
+        camera.update(self.bird.mv_field)  # スクロールはカメラを動かすだけ
+        lap("bird.update")
+        for name, group, args in [
+            ("beams.update", self.beams, ()),
+            ("ghosts.update", self.ghosts, (self.tmr,)),
+            ("bombs.update", self.bombs, (camera,)),
+            ("exps.update", self.exps, ()),
+            ("Goal.update", self.Goal, (camera,)),
+            ("emys.update", self.emys, ()),
+            ("funns.update", self.funns, (camera,)),
+            ("fields.update", self.fields, (camera,)),
+            ("Death_Fields.update", self.Death_Fields, (camera,)),
+            ("coins.update", self.coins, (camera,)),
+            ("skill1.update", self.skill1_group, ()),
+            ("hud.update", self.all_sprites, ()),
+        ]:
+            group.update(*args)
+            lap(name)
+        if self.shots is not None:
+            self.shots.step(camera)
+            lap("shots.update")
+        self.bird.mv_field = False
+        self.bird.mv_move = False
+        self.tmr += 1
+
+    def draw(self, present: bool = True):
+        """
+        現在の状態を画面に描画する（各グループをレイヤーのキューに積み，レイヤーごとに1回のblitsで描く）
+        引数 present：描画後に画面を更新するか（画面外のSurfaceに描く場合はFalse）
+        """
+        renderer, lap = self.renderer, self.profiler.lap
+        renderer.begin()
+        lap("background")
+        renderer.blit(self.bird.image, self.bird.rect, "actors")
+        for name, group, layer in [
+            ("Goal", self.Goal, "world"),
+            ("fields", self.fields, "world"),
+            ("Death_Fields", self.Death_Fields, "world"),
+            ("coins", self.coins, "world"),
+            ("beams", self.beams, "actors"),
+            ("ghosts", self.ghosts, "actors"),
+            ("bombs", self.bombs, "actors"),
+            ("emys", self.emys, "actors"),
+            ("funns", self.funns, "actors"),
+            ("exps", self.exps, "effects"),
+            ("skill1", self.skill1_group, "effects"),
+            ("hud", self.all_sprites, "hud"),
+        ]:
+            renderer.draw(group, layer)
+        if self.shots is not None:
+            renderer.extend(self.shots.blit_list(self.camera), "actors")
+        self.score.render()
+        renderer.blit(self.score.image, self.score.rect, "hud")
+        lap("queue")
+        for layer in renderer.layers:
+            renderer.flush(layer)
+            lap(f"blits.{layer}")
+        rect = self.profiler.draw(self.screen)
+        if rect is not None:
+            renderer.rects.append(rect)
+        lap("profiler.draw")
+        if present:
+            renderer.present()
+            lap("display.update")
+        else:  # 画面を更新しないので，描いた領域は次のフレームに持ち越さない
+            renderer.rects.clear()
+
+def main(dirty: bool = False, headless: bool = False, inputs=None,
+         max_frames: int | None = None, seed: int | None = None,
+         profiler: FrameProfiler | None = None, vector: bool = False,
+         interpolate: bool = False, fps: int = TICK_RATE, record: str | None = None,
+         capture: FrameCapture | None = None, prefetch: int | None = None) -> SimResult:
+    """
+    ゲームのメインループ
+    ロジックは1/TICK_RATE秒ごとの固定ステップで進め，描画は間に合う範囲で行う
+    （描画が遅れたフレームではロジックを複数回進めるので，ゲームの速さは描画に左右されない）
+    引数1 dirty：変化した領域だけを画面更新するか
+    引数2 headless：ウィンドウを出さず，描画・フレーム待ち・終了時の待ちをせずに実行するか
+    引数3 inputs：poll(tmr)で(押下キー, イベント)を返す入力（Noneならキーボード，headlessなら乱数）
+    引数4 max_frames：このフレーム数で打ち切る（Noneなら打ち切らない）
+    引数5 seed：ゲーム内の乱数の種
+    引数6 profiler：処理時間の計測（Noneなら計測せず，F3で表示を切り替えられる）
+    引数7 vector：爆弾とカラスの糞をNumPy配列でまとめて処理するか
+    引数8 interpolate：描画時にスクロール位置を前後の更新の間で補間するか
+    引数9 fps：描画の上限フレームレート
+    引数10 record：入力と乱数の種を記録するファイルのパス（Noneなら記録しない）
+    引数11 capture：描画したフレームを書き出すFrameCapture（Noneなら書き出さない．headlessでは描画しないので使われない）
+    引数12 prefetch：別スレッドで先に準備しておくチャンク数（Noneならheadlessでは0，そうでなければ2）
+    戻り値：プレイ結果
+    """
+    if headless:
+        if pg.display.get_init() and pg.display.get_driver() != "dummy":
+            pg.display.quit()
+        os.environ["SDL_VIDEODRIVER"] = "dummy"  # 画面を持たないSDLのドライバ
     pg.init()
-    main()
+    if seed is None and record is not None:  # 再生できるように種を決めて記録する
+        seed = random.getrandbits(32)
+    pg.display.set_caption("真！こうかとん無双")
+    screen = pg.display.set_mode((WIDTH, HEIGHT))
+    # アトラスがあれば1枚で読み込み，残りの画像をまとめて並列に読み込む（ウィンドウがあれば読み込み画面を出す）
+    Assets.load_atlas()
+    Assets.warm_up(asset_keys(), progress=None if headless else LoadingScreen(screen).draw)
+    if profiler is None:
+        profiler = FrameProfiler()
+    if prefetch is None:  # 描画しないなら，描画フレームの負荷を散らすスレッドはいらない
+        prefetch = 0 if headless else 2
+    game = Game(screen, dirty, profiler, vector, seed, prefetch)
+    if inputs is None:
+        inputs = RandomInput(seed, bird=game.bird) if headless else LiveInput()
+    if record is not None:
+        inputs = InputRecorder(inputs, record, seed)
+
+    clock = pg.time.Clock()
+    step = 1/TICK_RATE  # 1回の更新で進む時間（秒）
+    lag = 0.0  # まだロジックに反映していない経過時間（秒）
+    last = time.perf_counter()
+    try:
+        while True:
+            if headless:  # 時間を待たずに1回ずつ進める
+                ticks = 1
+            else:
+                now = time.perf_counter()
+                lag = min(lag+now-last, MAX_TICKS*step)  # 遅れすぎた分は切り捨てる
+                last = now
+                ticks = int(lag/step)
+                lag -= ticks*step
+            profiler.start_frame()
+            cause = None
+            for _ in range(ticks):
+                if max_frames is not None and game.tmr >= max_frames:
+                    return game.result("timeout")
+                key_lst, events = inputs.poll(game.tmr)
+                profiler.lap("input")
+                cause = game.update(key_lst, events)
+                if cause is not None:
+                    break
+            if cause == "quit":
+                return game.result(cause)
+            if not headless:
+                if interpolate:
+                    game.camera.interpolate(lag/step)
+                game.draw()
+                if capture is not None:
+                    capture.grab(screen, game.tmr)
+                    profiler.lap("capture")
+            profiler.end_frame(game.tmr)
+            if cause is not None:
+                if not headless:
+                    time.sleep(2)
+                return game.result(cause)
+            if not headless:
+                clock.tick(fps)
+    finally:
+        game.close()
+        profiler.close()
+        if record is not None:
+            inputs.close()
+        if capture is not None:
+            capture.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="真！こうかとん無双")
+    parser.add_argument("--dirty", action="store_true", help="変化した領域だけを画面更新する")
+    parser.add_argument("--headless", action="store_true", help="ウィンドウを出さずに乱数入力で実行する")
+    parser.add_argument("--frames", type=int, default=None, help="このフレーム数で打ち切る")
+    parser.add_argument("--seed", type=int, default=None, help="乱数の種")
+    parser.add_argument("--profile", action="store_true", help="処理時間を画面に表示する（F3で切り替え）")
+    parser.add_argument("--profile-csv", default=None, help="フレームごとの処理時間を書き出すCSVファイル")
+    parser.add_argument("--interpolate", action="store_true", help="描画時にスクロール位置を補間する")
+    parser.add_argument("--fps", type=int, default=TICK_RATE, help="描画の上限フレームレート（ロジックは常に毎秒TICK_RATE回）")
+    parser.add_argument("--record", default=None, help="フレームごとの入力と乱数の種を記録するファイル")
+    parser.add_argument("--replay", default=None, help="--recordで記録したファイルの入力で実行する")
+    parser.add_argument("--vector", action="store_true", help="爆弾とカラスの糞をNumPy配列でまとめて処理する")
+    parser.add_argument("--capture", default=None, help="描画したフレームを別スレッドで書き出す先（rawはファイル，pngはディレクトリ）")
+    parser.add_argument("--capture-format", choices=["raw", "png"], default="raw",
+                        help="rawは直近のフレームだけを残す1つのファイル，pngはフレームごとの画像")
+    parser.add_argument("--capture-slots", type=int, default=250, help="rawファイルに残すフレームの数")
+    args = parser.parse_args()
+    profiler = FrameProfiler(args.profile, args.profile_csv)
+    inputs, seed = None, args.seed
+    if args.replay is not None:  # 記録した入力と乱数の種で同じプレイを再現する
+        inputs = ReplayInput(args.replay)
+        seed = inputs.seed
+    if args.capture_slots < 1:
+        parser.error("--capture-slotsは1以上を指定してください")
+    capture = None
+    if args.capture is not None:
+        capture = FrameCapture(args.capture, args.capture_format, slots=args.capture_slots)
+    result = main(dirty=args.dirty, headless=args.headless, inputs=inputs, max_frames=args.frames, seed=seed,
+                  profiler=profiler, vector=args.vector, interpolate=args.interpolate, fps=args.fps,
+                  record=args.record, capture=capture)
+    if args.headless:
+        print(json.dumps(asdict(result)))
+    if capture is not None:  # 書き出したフレームと捨てたフレームの数
+        print(json.dumps({"capture": capture.stats()}), file=sys.stderr)
     pg.quit()
     sys.exit()